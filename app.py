@@ -1,37 +1,110 @@
 from datetime import datetime as dt
 from datetime import timedelta
+import json
 import os
-import io
+import time
+from urllib.parse import urlencode
+import zlib
 
 import flask
 import pandas as pd
-from bokeh.embed import components
-from bokeh.plotting import figure
-from bokeh.palettes import Set2_5 as palette
-from bokeh.models import Legend, HoverTool
-from bokeh.models.widgets import Panel, Tabs
-from bokeh.models import DatetimeTickFormatter
+from werkzeug.http import is_resource_modified
 
 import madison_lake_levels as mll
 
+# Bokeh is imported by the functions that plot. It is a large part of the
+# time it takes to import this module, and most requests are answered
+# from render_cache without it. Connecting to the database is also left
+# to the first request that needs it.
+
 app = flask.Flask(__name__)
 
-lldb = mll.db.LakeLevelDB(
-    **mll.db.config_from_dburl(os.getenv('DATABASE_URL'))
+lldb = mll.db.connect(
+    os.getenv('DATABASE_URL'),
+    pool_size=int(os.getenv('DB_POOL_SIZE', '1')),
+    pool_timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+)
+
+jobs = mll.jobs.job_queue(lldb)
+
+# Rendered pages and plots, reused until the data changes. Other workers'
+# writes are noticed within DATA_VERSION_MAX_AGE seconds.
+render_cache = mll.cache.VersionedCache(
+    maxsize=int(os.getenv('RENDER_CACHE_SIZE', '256'))
 )
+DATA_VERSION_MAX_AGE = float(os.getenv('DATA_VERSION_MAX_AGE', '30'))
+
+# Points per lake drawn on /plot-timeline, about one per pixel of width.
+TIMELINE_POINTS = int(os.getenv('TIMELINE_POINTS', '800'))
+
+# /api/series responses for ranges that end SERIES_SETTLED_DAYS or more
+# before today are cached by browsers for SERIES_MAX_AGE seconds. Later
+# days can still be revised by updates, so other ranges are revalidated
+# on every use.
+SERIES_MAX_AGE = int(os.getenv('SERIES_MAX_AGE', str(30 * 24 * 60 * 60)))
+SERIES_SETTLED_DAYS = int(os.getenv('SERIES_SETTLED_DAYS', '7'))
+
 
+# Requests slower than this many seconds are logged with a breakdown of
+# where the time went. Unset to disable.
+SLOW_REQUEST_SECONDS = os.getenv('SLOW_REQUEST_SECONDS')
 
-def _main_page(df, date=''):
+
+@app.before_request
+def _start_request_timer():
+    flask.g.request_start = time.perf_counter()
+    mll.metrics.start_trace()
+
+
+@app.after_request
+def _record_request_time(response):
+    seconds = time.perf_counter() - flask.g.request_start
+    spans = mll.metrics.end_trace()
+    mll.metrics.observe(
+        'mll_request_seconds', seconds,
+        endpoint=flask.request.endpoint or 'none',
+        method=flask.request.method, status=str(response.status_code)
+    )
+    if (SLOW_REQUEST_SECONDS is not None
+            and seconds >= float(SLOW_REQUEST_SECONDS)):
+        breakdown = ', '.join(
+            f'{name} {span_seconds * 1000:.1f}ms'
+            for name, span_seconds in spans
+        )
+        app.logger.warning(
+            f'Slow request {flask.request.method}'
+            f' {flask.request.full_path.rstrip("?")}'
+            f' took {seconds * 1000:.0f}ms: {breakdown or "no spans"}'
+        )
+    return response
+
+
+@app.route('/metrics')
+def metrics():
+    return flask.Response(mll.metrics.render_prometheus(),
+                          mimetype='text/plain; version=0.0.4')
+
+
+def render_template(*args, **kwargs):
+    with mll.metrics.span('render_template'):
+        return flask.render_template(*args, **kwargs)
+
+
+def _data_version():
+    return lldb.data_version(max_age=DATA_VERSION_MAX_AGE)
+
+
+def _main_page(df, date='', plot=None):
     df = df.sort_index()
     req_levels = mll.required_levels.required_levels
     req_maxes = req_levels['summer_maximum']
-    lakes = ['mendota', 'monona', 'waubesa', 'kegonsa']
+    lakes = list(mll.sites.LAKES)
     is_high = []
     heights = []
     for lake in lakes:
         df_lake = df[lake].dropna()
         if not df_lake.size:
-            return flask.render_template(
+            return render_template(
                 'main.html',
                 info=[],
                 high_lakes='No data available at this time.',
@@ -61,8 +134,10 @@ def _main_page(df, date=''):
     else:
         msg = ', '.join(high_lakes[:-1]) + f', and {high_lakes[-1]}'
         msg += f' {verb} above their state-required maximums.'
-    bokeh_script, bokeh_div = plot_year()
-    return flask.render_template(
+    if plot is None:
+        plot = render_cache.get('plot_year', _data_version(), plot_year)
+    bokeh_script, bokeh_div = plot
+    return render_template(
         'main.html', info=info, high_lakes=msg, date=date,
         plot_div=bokeh_div, bokeh_script=bokeh_script
     )
@@ -75,28 +150,229 @@ def favicon():
 
 @app.route('/')
 def main():
-    df = lldb.to_df()
-    return _main_page(df)
+    def render():
+        df = lldb.query(latest_only=True)
+        return _main_page(df)
+
+    return render_cache.get('/', _data_version(), render)
+
+
+def _date_header(date):
+    return f'<h5>Status on {date.strftime(r"%b %d, %Y")}</h5>'
 
 
 @app.route('/date/<date>')
 def specific_date(date):
-    df = lldb.to_df()
     date = pd.to_datetime(date)
-    df = df[df.index <= date]
-    return _main_page(
-        df, date=f'<h5>Status on {date.strftime(r"%b %d, %Y")}</h5>'
-    )
+
+    def render():
+        df = lldb.query(end=date, latest_only=True)
+        return _main_page(df, date=_date_header(date))
+
+    return render_cache.get(('/date', date), _data_version(), render)
+
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+_EXPORT_MIMETYPES = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.file',
+    'npz': 'application/octet-stream',
+}
 
 
 @app.route('/db')
 def database_dump():
-    df = lldb.to_df()
-    return flask.send_file(
-        io.BytesIO(df.to_csv().encode('utf-8')),
-        mimetype='text/csv',
-        attachment_filename='madison_lake_levels.csv',
-        as_attachment=True
+    args = flask.request.args
+    fmt = args.get('format', 'csv')
+    if fmt not in mll.db.EXPORT_FORMATS:
+        flask.abort(400, f'format must be one of {mll.db.EXPORT_FORMATS}.')
+    lakes = args['lakes'].split(',') if args.get('lakes') else None
+    start = args.get('start')
+    end = args.get('end')
+    use_gzip = fmt == 'csv' and 'gzip' in flask.request.accept_encodings
+
+    etag = str(lldb.data_version()) + ('-gzip' if use_gzip else '')
+    last_modified = lldb.last_modified()
+    headers = {
+        'Cache-Control': 'no-cache',
+        'Vary': 'Accept-Encoding',
+        'Content-Disposition':
+            f'attachment; filename=madison_lake_levels.{fmt}',
+    }
+    if not is_resource_modified(flask.request.environ, etag=etag,
+                                last_modified=last_modified):
+        response = flask.Response(status=304, headers=headers)
+    elif fmt == 'csv':
+        try:
+            chunks = lldb.iter_csv(start=start, end=end, lakes=lakes)
+        except ValueError as e:
+            flask.abort(400, str(e))
+        chunks = (chunk.encode('utf-8') for chunk in chunks)
+        if use_gzip:
+            chunks = _gzip_chunks(chunks)
+            headers['Content-Encoding'] = 'gzip'
+        response = flask.Response(chunks, mimetype='text/csv',
+                                  headers=headers)
+    else:
+        try:
+            data = lldb.export(fmt, start=start, end=end, lakes=lakes)
+        except ValueError as e:
+            flask.abort(400, str(e))
+        except ImportError:
+            flask.abort(501, f'{fmt} export needs pyarrow installed.')
+        response = flask.Response(data, mimetype=_EXPORT_MIMETYPES[fmt],
+                                  headers=headers)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    return response
+
+
+@app.route('/stats')
+def season_stats():
+    try:
+        start, end = (
+            None if flask.request.args.get(arg) is None
+            else int(flask.request.args[arg])
+            for arg in ['start', 'end']
+        )
+    except ValueError:
+        flask.abort(400, 'start and end must be years.')
+
+    def compute():
+        stats = lldb.season_stats(start_year=start, end_year=end)
+        out = {}
+        for (lake, season), row in stats.iterrows():
+            out.setdefault(lake, {})[season] = {
+                column: int(value) for column, value in row.items()
+            }
+        return out
+
+    return flask.jsonify(
+        render_cache.get(('/stats', start, end), _data_version(), compute)
+    )
+
+
+@app.route('/pool-stats')
+def pool_stats():
+    return flask.jsonify(lldb.pool_stats())
+
+
+def series_body(series, points=None, fmt='json') -> str:
+    """
+    Return the /api/series response for `series`, downsampled to about
+    `points` points per lake if given, see `LakeSeries.to_payload`.
+    """
+    if points is not None:
+        series = series[mll.downsample.downsample_rows(
+            series.days, series.values, points
+        )]
+    return json.dumps(series.to_payload(fmt), separators=(',', ':'))
+
+
+def series_url(start=None, end=None, points=None) -> str:
+    """
+    Return the /api/series URL the plots load a window of the levels
+    from, base64 encoded.
+    """
+    params = {'start': start, 'end': end, 'points': points}
+    params = {key: value for key, value in params.items() if value is not None}
+    return '/api/series?' + urlencode(dict(params, format='base64'))
+
+
+@app.route('/api/series')
+def api_series():
+    args = flask.request.args
+    fmt = args.get('format', 'json')
+    formats = mll.series.PAYLOAD_FORMATS
+    if fmt not in formats:
+        flask.abort(400, f'format must be one of {formats}.')
+    try:
+        start, end = (
+            None if args.get(arg) is None else pd.to_datetime(args[arg])
+            for arg in ['start', 'end']
+        )
+        points = None if args.get('points') is None else int(args['points'])
+    except ValueError:
+        flask.abort(400, 'start and end must be dates, points a number.')
+    if points is not None and points < 3:
+        flask.abort(400, 'points must be at least 3.')
+    lakes = args['lakes'].split(',') if args.get('lakes') else None
+
+    series = lldb.series()
+    for lake in lakes or []:
+        if lake not in series.lakes:
+            flask.abort(400, f'Unknown lake {lake!r}.')
+    if lakes is not None:
+        series = series.select(lakes)
+    body = series_body(series.between(start, end), points, fmt)
+
+    response = flask.Response(body, mimetype='application/json')
+    # The ETag is a hash of the body, so it stays valid for as long as
+    # the levels in the range do, whatever else is written.
+    response.add_etag()
+    settled = (pd.Timestamp.now(tz='US/Central')
+               - pd.Timedelta(days=SERIES_SETTLED_DAYS)).date()
+    if end is not None and end.date() < settled:
+        response.headers['Cache-Control'] = f'public, max-age={SERIES_MAX_AGE}'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(flask.request)
+
+
+# Turns an /api/series response into ColumnDataSource data: dates in
+# milliseconds since the epoch, as Bokeh draws them, and an array per
+# lake. Missing heights become NaN.
+_SERIES_JS = """
+function decode_column(column) {
+    if (Array.isArray(column)) {
+        return column.map(function(v) { return v === null ? NaN : v; });
+    }
+    var bytes = atob(column.__ndarray__);
+    var buffer = new ArrayBuffer(bytes.length);
+    var view = new Uint8Array(buffer);
+    for (var i = 0; i < bytes.length; i++) {
+        view[i] = bytes.charCodeAt(i);
+    }
+    return column.dtype === 'int32' ? new Int32Array(buffer)
+                                    : new Float32Array(buffer);
+}
+function series_data(response, lakes) {
+    var day = decode_column(response.day);
+    var data = {date: new Float64Array(day.length)};
+    for (var i = 0; i < day.length; i++) {
+        data.date[i] = day[i] * 864e5;
+    }
+    lakes.forEach(function(lake) {
+        data[lake] = decode_column(response[lake]);
+    });
+    return data;
+}
+"""
+_SERIES_ADAPTER_JS = 'return series_data(cb_data.response, lakes);'
+
+
+def _series_source(url, lakes, code=_SERIES_ADAPTER_JS, **args):
+    """
+    Return a data source that loads `lakes` from the /api/series `url`
+    once the page is shown, turned into data by the JavaScript `code`
+    run after _SERIES_JS with `lakes` and `args` in scope.
+    """
+    from bokeh.models import AjaxDataSource, CustomJS
+
+    return AjaxDataSource(
+        data_url=url, method='GET',
+        data={column: [] for column in ['date'] + list(lakes)},
+        adapter=CustomJS(args=dict(args, lakes=list(lakes)),
+                         code=_SERIES_JS + code)
     )
 
 
@@ -106,12 +382,72 @@ def old_plot_year():
 
 
 def plot_year():
-    df = lldb.to_df()
+    from bokeh.embed import components
+
+    tabs = plot_year_tabs()
+    with mll.metrics.span('bokeh.components'):
+        return components(tabs)
+
+
+# Lays one year of an /api/series response on the calendar of `year` the
+# way YearAligned does: February 29th is dropped, days after `last_day`
+# (0-based) are cut off and a NaN breaks the line where days are missing.
+_YEAR_ADAPTER_JS = """
+var data = series_data(cb_data.response, lakes);
+var out = {date: []};
+lakes.forEach(function(lake) { out[lake] = []; });
+var previous = -1;
+for (var i = 0; i < data.date.length; i++) {
+    var date = new Date(data.date[i]);
+    var month = date.getUTCMonth();
+    var day = date.getUTCDate();
+    if (month === 1 && day === 29) {
+        continue;
+    }
+    var slot = (Date.UTC(2001, month, day) - Date.UTC(2001, 0, 1)) / 864e5;
+    if (slot > last_day) {
+        break;
+    }
+    var x = Date.UTC(year, month, day);
+    if (previous >= 0 && slot > previous + 1) {
+        out.date.push(x);
+        lakes.forEach(function(lake) { out[lake].push(NaN); });
+    }
+    out.date.push(x);
+    lakes.forEach(function(lake) { out[lake].push(data[lake][i]); });
+    previous = slot;
+}
+return out;
+"""
+
+
+@mll.metrics.timed('plot_year')
+def plot_year_tabs(series_url=series_url):
+    from bokeh.plotting import figure
+    from bokeh.palettes import Set2_5 as palette
+    from bokeh.models import DatetimeTickFormatter, Legend
+    from bokeh.models.widgets import Panel, Tabs
+
+    series = lldb.series()
+    years, last_day = mll.aligned.year_span(series.dates(), years=9)
     req_levels = mll.required_levels.required_levels
     height = 450
     tabs = []
 
-    for lake, color in zip(df.columns, palette):
+    curr_year = int(years[-1])
+    # Every year is drawn up to the same day of the year as the latest data.
+    dates = mll.aligned.year_dates(curr_year)[:last_day + 1]
+    # Each year is loaded from /api/series on its own, so browsers keep
+    # the past years cached and only fetch the current one again.
+    sources = {
+        year: _series_source(
+            series_url(start=f'{year}-01-01', end=f'{year}-12-31'),
+            series.lakes, code=_YEAR_ADAPTER_JS, year=curr_year,
+            last_day=last_day
+        )
+        for year in years
+    }
+    for lake, color in zip(series.lakes, palette):
         p = figure(title=lake.title(),
                    x_axis_label=None,
                    x_axis_type='datetime',
@@ -122,26 +458,14 @@ def plot_year():
                    sizing_mode='stretch_width',
                    css_classes=['no-interaction'])
 
-        curr_year = df.index.year.max()
-        df = df[df.index.year >= curr_year - 8]
-        gb = df.copy().groupby(df.index.year)
-        curr_year_df = gb.get_group(curr_year)
-        curr_day_of_year = curr_year_df.index.dayofyear.max()
-        curr_day_of_year = min(curr_day_of_year, 365)  # leap years don't exist
-        first_day_of_year = curr_year_df.index[0]
-        max_line = p.line([curr_year_df.index.min(), curr_year_df.index.max()],
+        max_line = p.line([dates[0], dates[-1]],
                           2 * [req_levels.loc[lake, 'summer_maximum']],
                           color='#000000',
                           line_width=2,
                           line_dash=[5, 5],
                           line_alpha=0.5)
-        for year, idx in gb.groups.items():
-            year_df = df.loc[idx].copy()
-            year_df = year_df[year_df.index.dayofyear <= curr_day_of_year]
-            year_df.index = year_df.index.shift(
-                1, first_day_of_year - year_df.index[0]
-            )
-            line = p.line(year_df.index, year_df[lake],
+        for year in years:
+            line = p.line('date', lake, source=sources[year],
                           color=color, line_width=2,
                           line_alpha=1 if year == curr_year else 0.3)
             if year == curr_year:
@@ -166,19 +490,91 @@ def plot_year():
         p.legend.orientation = "vertical"
         tabs.append(Panel(child=p, title=lake.title()))
 
-    script, div = components(Tabs(tabs=tabs))
-    return script, div
+    return Tabs(tabs=tabs)
 
 
 @app.route('/plot-timeline')
 def plot_timeline():
-    df = lldb.to_df()
+    return render_cache.get(
+        '/plot-timeline', _data_version(), _plot_timeline_page
+    )
+
+
+# Debounced so that a zoom or pan makes one request once it settles. The
+# window fetched is three times as wide as the visible one so that
+# panning does not immediately run off the edge of the data.
+_TIMELINE_ZOOM_JS = """
+clearTimeout(window._timelineTimer);
+window._timelineTimer = setTimeout(function() {
+    // Responses may arrive out of order, only the newest is used.
+    var request = window._timelineRequest = (window._timelineRequest || 0) + 1;
+    if (window._timelineOverview === undefined) {
+        window._timelineOverview = source.data;
+    }
+    if (x_range.start <= first && x_range.end >= last) {
+        if (source.data !== window._timelineOverview) {
+            source.data = window._timelineOverview;
+        }
+        return;
+    }
+    var width = x_range.end - x_range.start;
+    var day = function(ms) {
+        return new Date(ms).toISOString().slice(0, 10);
+    };
+    fetch(url + '&start=' + day(Math.max(x_range.start - width, first))
+          + '&end=' + day(Math.min(x_range.end + width, last))
+    ).then(function(response) {
+        if (!response.ok) {
+            throw new Error(response.status + ' ' + response.statusText);
+        }
+        return response.json();
+    }).then(function(response) {
+        if (request !== window._timelineRequest) {
+            return;
+        }
+        source.data = series_data(response, lakes);
+    }).catch(function() {
+        // The overview covers every date, only coarser.
+        if (request === window._timelineRequest
+                && source.data !== window._timelineOverview) {
+            source.data = window._timelineOverview;
+        }
+    });
+}, 250);
+"""
+
+
+@mll.metrics.timed('plot_timeline')
+def _plot_timeline_page(series_url=series_url, zoom=True):
+    """
+    Render /plot-timeline, loading the levels from `series_url`. If
+    `zoom` is truthy, zooming in loads a finer sample of the visible
+    window from the same URL, with `start` and `end` added, so it must
+    be an /api/series URL.
+    """
+    from bokeh.embed import components
+    from bokeh.plotting import figure
+    from bokeh.palettes import Set2_5 as palette
+    from bokeh.models import CustomJS, CustomJSTransform
+    from bokeh.models import HoverTool, Legend
+    from bokeh.models.widgets import Panel, Tabs
+    from bokeh.transform import transform
+
+    series = lldb.series()
     req_levels = mll.required_levels.required_levels
 
     height = 700
 
+    # Both tabs draw from one downsampled source, loaded from /api/series.
+    # Zooming in replaces its data with a finer sample of the visible
+    # window.
+    url = series_url(points=TIMELINE_POINTS)
+    source = _series_source(url, series.lakes)
+    dates = series.dates()
+    first, last = dates.min(), dates.max()
+
     hover = HoverTool(
-        names=[lake.title() for lake in df],
+        names=[lake.title() for lake in series.lakes],
         tooltips=[('lake', '$name'), ('date', '$x{%F}'),
                   ('height above sea level', '$y{0.00} ft')],
         formatters={'$x': 'datetime'}
@@ -191,13 +587,14 @@ def plot_timeline():
                height=height,
                sizing_mode='stretch_width')
     p.toolbar.logo = None
+    x_range = p.x_range
 
     levels = []
     maxes = []
-    for lake, color in zip(df.columns, palette):
-        levels.append(p.line(df.index, df[lake],
+    for lake, color in zip(series.lakes, palette):
+        levels.append(p.line('date', lake, source=source,
                              color=color, line_width=2, name=lake.title()))
-        maxes.append(p.line([df.index.min(), df.index.max()],
+        maxes.append(p.line([first, last],
                             2 * [req_levels.loc[lake, 'summer_maximum']],
                             color=color,
                             line_width=2,
@@ -205,7 +602,7 @@ def plot_timeline():
                             line_alpha=0.8))
     _msg = p.circle([], [], color='#ffffff')
     legend_items = [('Click to hide', [_msg])]
-    for lake, level, _max in zip(df.columns, levels, maxes):
+    for lake, level, _max in zip(series.lakes, levels, maxes):
         lake = lake.title()
         legend_items.extend([(lake, [level]), (lake + ' max', [_max])])
     legend = Legend(items=legend_items, location=(0, 0))
@@ -214,7 +611,7 @@ def plot_timeline():
     tab1 = Panel(child=p, title="Absolute levels")
 
     hover = HoverTool(
-        names=[lake.title() for lake in df],
+        names=[lake.title() for lake in series.lakes],
         tooltips=[('lake', '$name'), ('date', '$x{%F}'),
                   ('height vs. max', '$y{+0.00} ft')],
         formatters={'$x': 'datetime'}
@@ -222,6 +619,7 @@ def plot_timeline():
     p = figure(title="Madison Lake Levels - difference from state max",
                x_axis_label='date',
                x_axis_type='datetime',
+               x_range=x_range,
                y_axis_label='Lake Height (feet above State Max)',
                tools=["pan,wheel_zoom,box_zoom,reset,previewsave", hover],
                height=height,
@@ -229,20 +627,24 @@ def plot_timeline():
     p.toolbar.logo = None
 
     levels = []
-    for lake, color in zip(df.columns, palette):
-        levels.append(p.line(df.index,
-                             df[lake] - req_levels.loc[lake, 'summer_maximum'],
+    for lake, color in zip(series.lakes, palette):
+        # The difference is computed in the browser from the shared source.
+        vs_max = CustomJSTransform(
+            args={'maximum': float(req_levels.loc[lake, 'summer_maximum'])},
+            v_func='return xs.map(function(x) { return x - maximum; });'
+        )
+        levels.append(p.line('date', transform(lake, vs_max), source=source,
                              name=lake.title(), color=color, line_width=2))
     _msg = p.circle([], [], color='#ffffff')
     legend_items = [('Click to hide', [_msg])]
     legend_items.append((
         'State Max',
-        [p.line([df.index.min(), df.index.max()],
+        [p.line([first, last],
                 [0, 0],
                 color='black',
                 line_dash=[5, 5])]
     ))
-    for lake, level in zip(df.columns, levels):
+    for lake, level in zip(series.lakes, levels):
         lake = lake.title()
         legend_items.append((lake, [level]))
     legend = Legend(items=legend_items, location=(0, 0))
@@ -251,11 +653,22 @@ def plot_timeline():
 
     tab2 = Panel(child=p, title='Levels compared to state maximum')
 
+    if zoom:
+        on_zoom = CustomJS(
+            args={'source': source, 'x_range': x_range,
+                  'lakes': series.lakes, 'url': url,
+                  'first': first.value // 10**6, 'last': last.value // 10**6},
+            code=_SERIES_JS + _TIMELINE_ZOOM_JS
+        )
+        x_range.js_on_change('start', on_zoom)
+        x_range.js_on_change('end', on_zoom)
+
     tabs = Tabs(tabs=[tab1, tab2])
 
-    script, div = components(tabs)
-    return flask.render_template('plot.html', bokeh_script=script,
-                                 plot_div=div)
+    with mll.metrics.span('bokeh.components'):
+        script, div = components(tabs)
+    return render_template('plot.html', bokeh_script=script,
+                           plot_div=div)
 
 
 @app.route('/update/', defaults={'start': None, 'end': None},
@@ -275,8 +688,50 @@ def update_db(start, end):
     else:
         end_dt = pd.to_datetime(end, utc=True).to_pydatetime()
 
-    mll.scrape.backfill(start_dt, end_dt, lldb, True)
-    return flask.redirect('/')
+    # The backfill itself is run by a worker, see bin/worker.py.
+    try:
+        job_id = jobs.enqueue(start_dt, end_dt)
+    except ValueError as e:
+        flask.abort(400, str(e))
+    status_url = flask.url_for('job_status', job_id=job_id)
+    response = flask.jsonify({'id': job_id, 'status_url': status_url})
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
+
+
+@app.route('/update/gaps', methods=['GET', 'POST'])
+def update_gaps():
+    args = flask.request.args
+    try:
+        gaps = lldb.gaps(start=args.get('start'), end=args.get('end'))
+    except ValueError as e:
+        flask.abort(400, str(e))
+    windows = mll.scrape.gap_windows(gaps, lldb.sites())
+
+    # A job backfills through its end day, so each window is queued from
+    # its first gap through its last.
+    queued = []
+    for start_dt, end_dt, _ in windows:
+        job_id = jobs.enqueue(start_dt, end_dt)
+        if job_id not in queued:
+            queued.append(job_id)
+    response = flask.jsonify({
+        'gap_days': len(gaps),
+        'jobs': [{'id': job_id,
+                  'status_url': flask.url_for('job_status', job_id=job_id)}
+                 for job_id in queued],
+    })
+    response.status_code = 202 if queued else 200
+    return response
+
+
+@app.route('/jobs/<int:job_id>')
+def job_status(job_id):
+    job = jobs.status(job_id)
+    if job is None:
+        flask.abort(404)
+    return flask.jsonify(job)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""
+Compare the batched LakeLevelDB.insert against the old row-by-row path.
+
+Connects using the same TEST_DB_* environment variables as the test suite
+and works in a scratch database that is dropped afterwards.
+"""
+import sys
+sys.path.append('..')
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+import madison_lake_levels as mll
+
+BENCH_DB_NAME = 'madisonlakes_bench'
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=5000,
+                        help='Number of days of synthetic data to insert.')
+    return parser
+
+
+def db_config() -> dict:
+    config = {'user': os.getenv('TEST_DB_USER', os.getenv('USER'))}
+    for key, env_var in [('password', 'TEST_DB_PASS'),
+                         ('host', 'TEST_DB_HOST'),
+                         ('port', 'TEST_DB_PORT')]:
+        value = os.getenv(env_var)
+        if value is not None:
+            config[key] = value
+    return config
+
+
+def _admin_execute(config, cmd):
+    conn = psycopg2.connect(database='template1', **config)
+    conn.autocommit = True
+    conn.cursor().execute(cmd)
+    conn.close()
+
+
+def insert_rowwise(lldb: mll.db.LakeLevelDB, df: pd.DataFrame):
+    """
+    The original implementation of LakeLevelDB.insert(df, replace=True):
+    one SELECT plus one UPDATE or INSERT per row, into the wide levels
+    table of the time, with a column per lake.
+    """
+    columns = lldb._columns
+    df = df[columns[1:]]
+    create_cmd = """CREATE TABLE IF NOT EXISTS levels_rowwise (
+        datetime date PRIMARY KEY,
+        mendota real,
+        monona real,
+        waubesa real,
+        kegonsa real
+    )
+    """
+    insert_cmd = """INSERT INTO levels_rowwise (
+        datetime, mendota, monona, waubesa, kegonsa
+    )
+    VALUES (%s, %s, %s, %s, %s);
+    """
+    update_cmd_static = """UPDATE levels_rowwise
+    SET {columns}
+    WHERE datetime=%s;
+    """
+    select_cmd = "SELECT * FROM levels_rowwise WHERE datetime=%s;"
+    with lldb._transaction() as cursor:
+        cursor.execute(create_cmd)
+        for time_, row in df.iterrows():
+            cursor.execute(select_cmd, (time_,))
+            result = cursor.fetchone()
+            update_cmd = update_cmd_static
+            if result:
+                for lake, height in zip(columns[1:], result[1:]):
+                    if (
+                        height < row[lake]
+                        or (pd.isnull(height) and not pd.isnull(row[lake]))
+                    ):
+                        update_cmd = update_cmd.format(
+                            columns=f'{lake}={row[lake]}, {{columns}}'
+                        )
+                update_cmd = update_cmd.replace(', {columns}', '')
+                if 'SET {columns}' not in update_cmd:
+                    cursor.execute(update_cmd, (time_,))
+            else:
+                cursor.execute(insert_cmd, [time_] + row.tolist())
+
+
+def synthetic_levels(days: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.RandomState(seed)
+    lakes = ['mendota', 'monona', 'waubesa', 'kegonsa']
+    base = np.array([850.0, 845.0, 844.8, 843.2])
+    values = base + rng.normal(scale=0.3, size=(days, len(lakes)))
+    index = pd.date_range('2007-10-01', periods=days).date
+    return pd.DataFrame(values, index=index, columns=lakes)
+
+
+def time_insert(insert, config, df_first, df_second):
+    """
+    Time inserting into an empty table, then re-inserting
+    overlapping data that exercises the keep-the-higher-value rule.
+    """
+    _admin_execute(config, f'DROP DATABASE IF EXISTS {BENCH_DB_NAME}')
+    _admin_execute(config, f'CREATE DATABASE {BENCH_DB_NAME}')
+    lldb = mll.db.LakeLevelDB(database=BENCH_DB_NAME, **config)
+    times = []
+    for df in [df_first, df_second]:
+        t0 = time.perf_counter()
+        insert(lldb, df)
+        times.append(time.perf_counter() - t0)
+    lldb.close()
+    return times
+
+
+def main(days):
+    config = db_config()
+    df_first = synthetic_levels(days, seed=0)
+    df_second = synthetic_levels(days, seed=1)
+
+    def insert_bulk(lldb, df):
+        lldb.insert(df)
+
+    print(f'Inserting {days} days, then upserting {days} days over them')
+    results = {}
+    for name, insert in [('row-by-row', insert_rowwise),
+                         ('bulk', insert_bulk)]:
+        results[name] = time_insert(insert, config, df_first, df_second)
+        print(f'  {name:>10}: insert {results[name][0]:8.3f}s,'
+              f' upsert {results[name][1]:8.3f}s')
+    speedups = np.array(results['row-by-row']) / np.array(results['bulk'])
+    print(f'  speedup   : insert {speedups[0]:7.1f}x,'
+          f' upsert {speedups[1]:7.1f}x')
+
+    _admin_execute(config, f'DROP DATABASE IF EXISTS {BENCH_DB_NAME}')
+
+
+if __name__ == '__main__':
+    p = build_parser()
+    args = p.parse_args()
+    main(args.days)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Measure the memory each app worker holds for the lake levels, and the
+memory allocated while serving the pages and data that are drawn from
+them, against a SQLite file of synthetic levels.
+
+Allocations are traced with tracemalloc, which NumPy and pandas report
+their buffers to, and each number is the peak while serving one request.
+"""
+import sys
+sys.path.append('..')
+
+import argparse
+from datetime import timedelta
+import os
+import tempfile
+import tracemalloc
+
+import madison_lake_levels as mll
+
+from bench_insert import synthetic_levels
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db-days', type=int, default=5000,
+                        help='Days of levels in the database.')
+    return parser
+
+
+def peak_allocated(f) -> int:
+    """
+    Return the most memory allocated at once while `f()` runs, in bytes.
+    """
+    tracemalloc.start()
+    try:
+        f()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _print(name, n_bytes):
+    print(f'{name:>36}: {n_bytes / 1024:10.1f} KiB')
+
+
+def main(db_days):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_url = f'sqlite:///{tmp_dir}/levels.db'
+        lldb = mll.db.connect(db_url)
+        lldb.insert(synthetic_levels(db_days, seed=0))
+        lldb.close()
+        os.environ['DATABASE_URL'] = db_url
+        import app
+
+        series = app.lldb.series()
+        frame = app.lldb.to_df()
+        _print('held: LakeSeries', series.nbytes)
+        _print('held: DataFrame', frame.memory_usage(deep=True).sum())
+
+        _print('call: LakeLevelDB.series', peak_allocated(app.lldb.series))
+        _print('call: LakeLevelDB.to_df', peak_allocated(app.lldb.to_df))
+
+        last = series.dates()[-1].date()
+        year = timedelta(days=365)
+        client = app.app.test_client()
+        urls = {
+            '/': '/',
+            '/plot-timeline': '/plot-timeline',
+            '/api/series': '/api/series',
+            '/api/series (base64)': '/api/series?format=base64',
+            '/api/series (a year)':
+                app.series_url(start=last - year, end=last),
+        }
+        for name, url in urls.items():
+            def get():
+                app.render_cache.clear()
+                assert client.get(url).status_code == 200
+            get()
+            _print(f'request: {name}', peak_allocated(get))
+        app.lldb.close()
+
+
+if __name__ == '__main__':
+    p = build_parser()
+    args = p.parse_args()
+    main(args.db_days)
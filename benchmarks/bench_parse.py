@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Compare the vectorized USGS instantaneous value parsers against the
+original per-reading JSON parsing on a large synthetic payload.
+"""
+import sys
+sys.path.append('..')
+
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from madison_lake_levels import scrape
+import usgs_payloads
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=365,
+                        help='Days of 15 minute readings in the payload.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Take the best of this many runs.')
+    return parser
+
+
+def parse_iv_json_legacy(text: str) -> pd.DataFrame:
+    """
+    The original parsing loop of scrape.scrape.
+    """
+    d = json.loads(text)
+    df = pd.DataFrame({})
+    for ts in d['value']['timeSeries']:
+        lake_name = scrape._format_usgs_lake_names(
+            ts['sourceInfo']['siteName']
+        )
+        values = ts['values'][0]['value']
+        null_value = ts['variable']['noDataValue']
+        values = [v for v in values if float(v['value']) != null_value]
+        gage_heights = [float(v['value']) for v in values]
+        times = [v['dateTime'] for v in values]
+        df[lake_name] = pd.Series(dict(zip(times, gage_heights)))
+    for lake_name in scrape.lake_name_to_usgs_site_num.keys():
+        if lake_name.lower() not in df.columns:
+            df[lake_name.lower()] = np.nan
+    df.index = pd.to_datetime(df.index, utc=True)
+    return df
+
+
+def best_time(f, text, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        f(text)
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main(days, repeat):
+    json_text = usgs_payloads.iv_json(days=days)
+    rdb_text = usgs_payloads.iv_rdb(days=days)
+    n = days * 24 * 4 * len(usgs_payloads.SITES)
+    print(f'{n} readings: JSON payload {len(json_text) / 1e6:.1f} MB,'
+          f' RDB payload {len(rdb_text) / 1e6:.1f} MB')
+    decode = best_time(json.loads, json_text, repeat)
+    print(f'  json.loads alone takes {decode:.3f}s')
+    legacy = best_time(parse_iv_json_legacy, json_text, repeat)
+    for name, f, text in [
+        ('json (legacy)', parse_iv_json_legacy, json_text),
+        ('json', scrape.parse_iv_json, json_text),
+        ('rdb', scrape.parse_iv_rdb, rdb_text),
+    ]:
+        t = legacy if f is parse_iv_json_legacy else best_time(f, text, repeat)
+        print(f'  {name:>13}: {t:7.3f}s  {n / t / 1e6:5.2f}M readings/s'
+              f'  {legacy / t:5.1f}x')
+
+
+if __name__ == '__main__':
+    p = build_parser()
+    args = p.parse_args()
+    main(args.days, args.repeat)
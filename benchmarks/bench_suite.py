@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+"""
+Time the main code paths of the app against synthetic data, with USGS
+replaced by the local server in fake_usgs.py, and write one JSON object
+per benchmark so results can be compared across commits.
+
+Database benchmarks use a scratch database, connecting with the same
+TEST_DB_* environment variables as the test suite. Pass --no-db to skip
+them. Startup benchmarks time `import app` and the first response in new
+processes, against a SQLite file.
+
+    python bench_suite.py --output results.jsonl
+"""
+import sys
+sys.path.append('..')
+
+import argparse
+from datetime import datetime, timedelta, timezone
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import madison_lake_levels as mll
+from madison_lake_levels import scrape
+
+from bench_insert import BENCH_DB_NAME, db_config, _admin_execute
+from bench_insert import synthetic_levels
+from fake_usgs import FakeUSGS
+import usgs_payloads
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', default=None,
+                        help='Append results to this file instead of'
+                             ' printing them.')
+    parser.add_argument('--only', default=None,
+                        help='Only run benchmarks whose name contains this.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of timed runs of each benchmark.')
+    parser.add_argument('--days', type=int, default=365,
+                        help='Days of readings in the scraped payloads.')
+    parser.add_argument('--interval-minutes', type=int, default=15,
+                        help='Minutes between synthetic USGS readings.')
+    parser.add_argument('--db-days', type=int, default=5000,
+                        help='Days of levels in the database benchmarks.')
+    parser.add_argument('--no-db', action='store_true',
+                        help='Skip benchmarks that need a database.')
+    return parser
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Suite():
+    def __init__(self, repeat, only, output):
+        self.repeat = repeat
+        self.only = only
+        self.output = output
+        self.context = {
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'time': datetime.now(timezone.utc).isoformat(),
+        }
+
+    def run(self, name, f, setup=None, items=None, **params):
+        """
+        Time `f()` `self.repeat` times, calling `setup()` untimed before
+        each run, and record the result under `name`. `items` is the number
+        of things processed per run, for throughput.
+        """
+        if self.only is not None and self.only not in name:
+            return
+        times = []
+        for _ in range(self.repeat):
+            if setup is not None:
+                setup()
+            t0 = time.perf_counter()
+            f()
+            times.append(time.perf_counter() - t0)
+        self.record(name, times, items=items, **params)
+
+    def record(self, name, times, items=None, **params):
+        """
+        Record run times of `name` that were measured elsewhere.
+        """
+        result = dict(self.context, benchmark=name, params=params,
+                      repeat=len(times), best=min(times),
+                      mean=sum(times) / len(times), items=items)
+        line = json.dumps(result)
+        if self.output is None:
+            print(line)
+        else:
+            with open(self.output, 'a') as f:
+                f.write(line + '\n')
+        print(f'{name:>28}: {min(times):8.4f}s best', file=sys.stderr)
+
+
+def bench_scrape(suite, days, interval_minutes):
+    start = datetime(2010, 1, 1)
+    end = start + timedelta(days=days - 1)
+    readings = days * 24 * 60 // interval_minutes * len(usgs_payloads.SITES)
+    params = {'days': days, 'interval_minutes': interval_minutes}
+    json_text = usgs_payloads.iv_json(days=days, start=start,
+                                      interval_minutes=interval_minutes)
+    rdb_text = usgs_payloads.iv_rdb(days=days, start=start,
+                                    interval_minutes=interval_minutes)
+    suite.run('parse.iv_json', lambda: scrape.parse_iv_json(json_text),
+              items=readings, **params)
+    suite.run('parse.iv_rdb', lambda: scrape.parse_iv_rdb(rdb_text),
+              items=readings, **params)
+
+    sites = ','.join(scrape.lake_name_to_usgs_site_num.values())
+
+    def forget_datum():
+        scrape._datum_memory.clear()
+        for path in os.listdir(scrape.datum_cache_dir):
+            os.remove(os.path.join(scrape.datum_cache_dir, path))
+
+    suite.run('datum.fetch', lambda: scrape.get_datum_elevation(sites),
+              setup=forget_datum)
+    suite.run('datum.disk', lambda: scrape.get_datum_elevation(sites),
+              setup=scrape._datum_memory.clear)
+    suite.run('datum.memory', lambda: scrape.get_datum_elevation(sites))
+
+    for fmt in ['json', 'rdb']:
+        # Responses are generated once and then served from memory.
+        scrape.scrape(start, end, fmt=fmt)
+        suite.run(f'scrape.{fmt}', lambda: scrape.scrape(start, end, fmt=fmt),
+                  items=readings, **params)
+
+
+def bench_db(suite, days, db_days, interval_minutes):
+    config = db_config()
+    config['database'] = BENCH_DB_NAME
+
+    def fresh_db():
+        _admin_execute(db_config(), f'DROP DATABASE IF EXISTS {BENCH_DB_NAME}')
+        _admin_execute(db_config(), f'CREATE DATABASE {BENCH_DB_NAME}')
+        return mll.db.LakeLevelDB(**config)
+
+    df_first = synthetic_levels(db_days, seed=0)
+    df_second = synthetic_levels(db_days, seed=1)
+    state = {}
+
+    def empty():
+        if 'lldb' in state:
+            state['lldb'].close()
+        state['lldb'] = fresh_db()
+
+    def filled():
+        empty()
+        state['lldb'].insert(df_first)
+
+    suite.run('db.insert', lambda: state['lldb'].insert(df_first),
+              setup=empty, items=db_days, days=db_days)
+    suite.run('db.upsert', lambda: state['lldb'].insert(df_second),
+              setup=filled, items=db_days, days=db_days)
+
+    def cold():
+        # A new LakeLevelDB has nothing cached yet.
+        filled()
+        state['lldb'].close()
+        state['lldb'] = mll.db.LakeLevelDB(**config)
+
+    suite.run('db.to_df.cold', lambda: state['lldb'].to_df(), setup=cold,
+              items=db_days, days=db_days)
+    suite.run('db.to_df.warm', lambda: state['lldb'].to_df(),
+              items=db_days, days=db_days)
+    suite.run('db.series.warm', lambda: state['lldb'].series(),
+              items=db_days, days=db_days)
+    suite.run('db.gaps', lambda: state['lldb'].gaps(),
+              items=db_days, days=db_days)
+
+    start = datetime(2010, 1, 1, tzinfo=timezone.utc)
+    end = start + timedelta(days=days)
+    suite.run('backfill', lambda: scrape.backfill(
+        start, end, state['lldb'], workers=4, rate=1000
+    ), setup=empty, items=days, days=days, interval_minutes=interval_minutes)
+
+    # The app connects on import, so point it at the benchmark database.
+    filled()
+    user = config['user']
+    password = config.get('password', '')
+    host = config.get('host', '')
+    port = config.get('port', '')
+    os.environ['DATABASE_URL'] = (
+        f'postgres://{user}:{password}@{host}:{port}/{BENCH_DB_NAME}'
+    )
+    import app
+    with app.app.test_request_context():
+        suite.run('render.main_page', lambda: app._main_page(
+            app.lldb.query(latest_only=True)
+        ), setup=app.render_cache.clear, days=db_days)
+        suite.run('render.plot_year', app.plot_year,
+                  setup=app.render_cache.clear, days=db_days)
+        suite.run('render.plot_timeline', app._plot_timeline_page,
+                  setup=app.render_cache.clear, days=db_days)
+    app.lldb.close()
+    state['lldb'].close()
+    _admin_execute(db_config(), f'DROP DATABASE IF EXISTS {BENCH_DB_NAME}')
+
+
+# Run in a fresh interpreter by bench_startup, printing its timings.
+_STARTUP_SCRIPT = """
+import json
+import time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+response = app.app.test_client().get('/')
+t2 = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({'import': t1 - t0, 'first_response': t2 - t1}))
+"""
+
+
+def bench_startup(suite, db_days):
+    """
+    Time `import app` and its first response in new processes, as a
+    freshly booted worker would see them. The app reads a SQLite file
+    of synthetic levels, so no database server is needed.
+    """
+    names = {key: f'startup.{key}' for key in ['import', 'first_response']}
+    names = {key: name for key, name in names.items()
+             if suite.only is None or suite.only in name}
+    if not names:
+        return
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_url = f'sqlite:///{tmp_dir}/levels.db'
+        lldb = mll.db.connect(db_url)
+        lldb.insert(synthetic_levels(db_days, seed=0))
+        lldb.close()
+        env = dict(os.environ, DATABASE_URL=db_url)
+        runs = []
+        for _ in range(suite.repeat):
+            out = subprocess.run(
+                [sys.executable, '-c', _STARTUP_SCRIPT], cwd=repo, env=env,
+                capture_output=True, text=True, check=True
+            ).stdout
+            runs.append(json.loads(out.splitlines()[-1]))
+    for key, name in names.items():
+        suite.record(name, [run[key] for run in runs], days=db_days)
+
+
+def main(output, only, repeat, days, interval_minutes, db_days, no_db):
+    suite = Suite(repeat, only, output)
+    with FakeUSGS(interval_minutes=interval_minutes) as server, \
+            tempfile.TemporaryDirectory() as cache_dir:
+        scrape.usgs_iv_url = server.iv_url
+        scrape.usgs_site_url = server.site_url
+        scrape.datum_cache_dir = cache_dir
+        bench_scrape(suite, days, interval_minutes)
+        bench_startup(suite, db_days)
+        if not no_db:
+            bench_db(suite, days, db_days, interval_minutes)
+
+
+if __name__ == '__main__':
+    p = build_parser()
+    args = p.parse_args()
+    main(args.output, args.only, args.repeat, args.days,
+         args.interval_minutes, args.db_days, args.no_db)
@@ -0,0 +1,126 @@
+"""
+A local stand-in for the USGS water services, serving the synthetic
+payloads from usgs_payloads. Point madison_lake_levels.scrape at it with
+
+    with FakeUSGS() as server:
+        scrape.usgs_iv_url = server.iv_url
+        scrape.usgs_site_url = server.site_url
+
+or run this file and set the USGS_IV_URL and USGS_SITE_URL environment
+variables to the URLs it prints.
+"""
+import argparse
+import functools
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+
+import usgs_payloads
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--interval-minutes', type=int, default=15,
+                        help='Minutes between synthetic readings.')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds to wait before each response.')
+    return parser
+
+
+@functools.lru_cache(maxsize=256)
+def _iv_payload(fmt, start, days, interval_minutes):
+    if fmt == 'rdb':
+        return usgs_payloads.iv_rdb(days=days, start=start,
+                                    interval_minutes=interval_minutes)
+    return usgs_payloads.iv_json(days=days, start=start,
+                                 interval_minutes=interval_minutes)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Set on subclasses made by FakeUSGS.
+    interval_minutes = 15
+    latency = 0.0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        args = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if self.latency:
+            time.sleep(self.latency)
+        if url.path.rstrip('/') == '/nwis/site':
+            body = usgs_payloads.site_rdb()
+        elif url.path.rstrip('/') == '/nwis/iv':
+            # Without a start date USGS returns the latest readings.
+            start = datetime.strptime(args.get('startDT', '2010-01-01'),
+                                      '%Y-%m-%d')
+            if 'endDT' in args:
+                end = datetime.strptime(args['endDT'], '%Y-%m-%d')
+                days = max((end - start).days, 0) + 1
+            else:
+                days = 1
+            body = _iv_payload(args.get('format', 'json'), start, days,
+                               self.interval_minutes)
+        else:
+            self.send_error(404)
+            return
+        data = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    # scrape sends its requests as POSTs with the arguments in the URL.
+    do_POST = do_GET
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeUSGS():
+    def __init__(self, port=0, interval_minutes=15, latency=0.0):
+        """
+        Serve synthetic USGS responses from a background thread.
+
+        Inputs
+        ------
+        port : int
+            Port to listen on, 0 picks a free one.
+        interval_minutes : int
+            Minutes between readings in instantaneous value responses,
+            which sets how large they are.
+        latency : float
+            Seconds to wait before answering each request.
+        """
+        handler = type('Handler', (_Handler,), {
+            'interval_minutes': interval_minutes, 'latency': latency,
+        })
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+        self._server.daemon_threads = True
+        host, port = self._server.server_address
+        self.iv_url = f'http://{host}:{port}/nwis/iv/'
+        self.site_url = f'http://{host}:{port}/nwis/site/'
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == '__main__':
+    p = build_parser()
+    args = p.parse_args()
+    with FakeUSGS(args.port, args.interval_minutes, args.latency) as server:
+        print(f'USGS_IV_URL={server.iv_url}')
+        print(f'USGS_SITE_URL={server.site_url}')
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
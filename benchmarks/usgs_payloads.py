@@ -0,0 +1,123 @@
+"""
+Synthetic payloads shaped like the USGS water services responses that
+madison_lake_levels.scrape parses.
+"""
+import json
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+# (site number, station name, datum elevation, typical gage height)
+SITES = [
+    ('05428000', 'LAKE MENDOTA AT MADISON, WI', 840.0, 9.5),
+    ('05429000', 'LAKE MONONA AT MADISON, WI', 840.0, 4.9),
+    ('05429485', 'LAKE WAUBESA AT MCFARLAND, WI', 840.0, 4.7),
+    ('425715089164700', 'LAKE KEGONSA AT STOUGHTON, WI', 840.0, 3.1),
+]
+NO_DATA_VALUE = -999999.0
+
+
+def _central_offset(t: datetime) -> timedelta:
+    # Close enough to US daylight saving time for synthetic data.
+    return timedelta(hours=-5 if 3 < t.month < 11 else -6)
+
+
+def _readings(days, interval_minutes, null_fraction, seed, start):
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    n = days * 24 * 60 // interval_minutes
+    times = [start + timedelta(minutes=interval_minutes * i)
+             for i in range(n)]
+    rng = np.random.RandomState(seed)
+    per_site = []
+    for _, _, _, height in SITES:
+        values = height + np.cumsum(rng.normal(scale=0.002, size=n))
+        values[rng.rand(n) < null_fraction] = NO_DATA_VALUE
+        per_site.append(values)
+    return times, per_site
+
+
+def iv_json(days=365, interval_minutes=15, null_fraction=0.01, seed=0,
+            start=datetime(2010, 1, 1)):
+    """
+    Return the text of an instantaneous values response in JSON format.
+    """
+    times, per_site = _readings(days, interval_minutes, null_fraction, seed,
+                                start)
+    local = [t + _central_offset(t) for t in times]
+    stamps = [
+        t.strftime('%Y-%m-%dT%H:%M:%S.000')
+        + ('-05:00' if _central_offset(u).total_seconds() == -5 * 3600
+           else '-06:00')
+        for t, u in zip(local, times)
+    ]
+    time_series = []
+    for (site, name, _, _), values in zip(SITES, per_site):
+        time_series.append({
+            'sourceInfo': {
+                'siteName': name,
+                'siteCode': [{'value': site, 'agencyCode': 'USGS'}],
+            },
+            'variable': {
+                'variableCode': [{'value': '00065'}],
+                'noDataValue': NO_DATA_VALUE,
+            },
+            'values': [{
+                'value': [
+                    {'value': f'{v:.2f}', 'qualifiers': ['P'],
+                     'dateTime': s}
+                    for v, s in zip(values, stamps)
+                ],
+            }],
+            'name': f'USGS:{site}:00065:00000',
+        })
+    return json.dumps({'value': {'timeSeries': time_series}})
+
+
+def iv_rdb(days=365, interval_minutes=15, null_fraction=0.01, seed=0,
+           start=datetime(2010, 1, 1)):
+    """
+    Return the text of an instantaneous values response in RDB format.
+    """
+    times, per_site = _readings(days, interval_minutes, null_fraction, seed,
+                                start)
+    lines = ['# Synthetic USGS instantaneous values', '#']
+    for i, ((site, name, _, _), values) in enumerate(zip(SITES, per_site)):
+        ts_id = 100000 + i
+        lines.extend([
+            f'# Data provided for site {site}',
+            '#            TS   parameter     Description',
+            f'#        {ts_id}       00065     Gage height, feet',
+            '#',
+            f'agency_cd\tsite_no\tdatetime\ttz_cd\t{ts_id}_00065'
+            f'\t{ts_id}_00065_cd',
+            '5s\t15s\t20d\t6s\t14n\t10s',
+        ])
+        for t, v in zip(times, values):
+            offset = _central_offset(t)
+            tz_cd = 'CDT' if offset.total_seconds() == -5 * 3600 else 'CST'
+            local = (t + offset).strftime('%Y-%m-%d %H:%M')
+            if v == NO_DATA_VALUE:
+                lines.append(f'USGS\t{site}\t{local}\t{tz_cd}\t\tEqp')
+            else:
+                lines.append(f'USGS\t{site}\t{local}\t{tz_cd}\t{v:.2f}\tP')
+    return '\n'.join(lines) + '\n'
+
+
+def site_rdb():
+    """
+    Return the text of a site service response in RDB format, which is
+    where the datum elevations come from.
+    """
+    lines = [
+        '# Synthetic USGS site information',
+        '#',
+        'agency_cd\tsite_no\tstation_nm\tsite_tp_cd\tdec_lat_va'
+        '\tdec_long_va\tcoord_acy_cd\tdec_coord_datum_cd\talt_va'
+        '\talt_acy_va\talt_datum_cd\thuc_cd',
+        '5s\t15s\t50s\t7s\t16s\t16s\t1s\t10s\t8s\t3s\t10s\t16s',
+    ]
+    for site, name, datum, _ in SITES:
+        lines.append(f'USGS\t{site}\t{name}\tLK\t43.0\t-89.4\tS\tNAD83'
+                     f'\t{datum:.2f}\t.01\tNGVD29\t07090001')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""
+Rebuild the database directly from USGS data, without going through the
+web app. Uses the DATABASE_URL environment variable.
+"""
+import sys
+sys.path.append('..')
+
+import argparse
+import os
+from datetime import datetime as dt
+
+import pandas as pd
+
+import madison_lake_levels as mll
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--start', default='2007-10-01',
+                        help='First date to scrape.')
+    parser.add_argument('--end', default=None,
+                        help='Last date to scrape, defaults to now.')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Number of concurrent requests to USGS.')
+    parser.add_argument('--rate', type=float, default=2.0,
+                        help='Maximum requests per second to USGS.')
+    parser.add_argument('--checkpoint', default=None,
+                        help='File to record progress in and resume from.')
+    parser.add_argument('--gaps', action='store_true',
+                        help='Only scrape the days between --start and'
+                             ' --end (default the last stored day) that'
+                             ' some sites have no level on.')
+    return parser
+
+
+def main(start, end, workers, rate, checkpoint, gaps=False):
+    lldb = mll.db.connect(os.getenv('DATABASE_URL'))
+    if gaps:
+        mll.scrape.backfill_gaps(lldb, start=start, end=end, verbose=True,
+                                 workers=workers, rate=rate)
+        return
+    start_dt = pd.to_datetime(start, utc=True).to_pydatetime()
+    if end is None:
+        end_dt = pd.Timestamp(dt.utcnow(), tz='UTC').to_pydatetime()
+    else:
+        end_dt = pd.to_datetime(end, utc=True).to_pydatetime()
+    mll.scrape.backfill(start_dt, end_dt, lldb, verbose=True,
+                        workers=workers, rate=rate, checkpoint=checkpoint)
+
+
+if __name__ == '__main__':
+    p = build_parser()
+    args = p.parse_args()
+    main(args.start, args.end, args.workers, args.rate, args.checkpoint,
+         args.gaps)
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+"""
+Render the site to static HTML files, each with a gzipped copy next to it,
+so that a plain web server can serve it without running any Python.
+
+    index.html              /
+    plot-timeline.html      /plot-timeline
+    date/YYYY-MM-DD.html    /date/YYYY-MM-DD, for every day with data
+    plot-year.js            the plot embedded in all of the above pages
+    series/*.json           the levels the plots load, as from /api/series
+    static/                 a copy of the app's static files
+    manifest.json           the data version the files were built from
+
+When a manifest exists, only the date pages whose content could have
+changed since the version it records are rendered again.
+"""
+import sys
+sys.path.append('..')
+
+import argparse
+import gzip
+import json
+import os
+from pathlib import Path
+import shutil
+
+import numpy as np
+import pandas as pd
+from bokeh.embed import json_item
+
+import app as site
+
+_PLOT_TARGET = 'plot-year'
+_PLOT = (
+    '<script src="/plot-year.js"></script>',
+    f'<div id="{_PLOT_TARGET}"></div>',
+)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--out', default='../build',
+                        help='Directory to write the site to.')
+    parser.add_argument('--full', action='store_true',
+                        help='Render every page, ignoring the manifest.')
+    return parser
+
+
+def write(out: Path, path: str, text: str):
+    """
+    Write `text` to out/path and a gzipped copy to out/path.gz. Files
+    are replaced atomically, so the web server never sees a partial page.
+    """
+    data = text.encode('utf-8')
+    target = out / path
+    target.parent.mkdir(parents=True, exist_ok=True)
+    for suffix, content in [('', data),
+                            ('.gz', gzip.compress(data, 9, mtime=0))]:
+        tmp = target.with_name(target.name + suffix + '.tmp')
+        tmp.write_bytes(content)
+        os.replace(tmp, target.with_name(target.name + suffix))
+
+
+def static_series_url(windows: dict):
+    """
+    Return a stand-in for `app.series_url` that names a static file for
+    each window of levels the plots load, and records the windows in
+    `windows` by path.
+    """
+    def series_url(start=None, end=None, points=None):
+        path = (f'series/{start or "first"}_{end or "last"}'
+                f'_{points or "all"}.json')
+        windows[path] = (start, end, points)
+        return '/' + path
+    return series_url
+
+
+def affected_days(levels: pd.DataFrame, changed: pd.DatetimeIndex) -> np.ndarray:
+    """
+    Return a mask of the days in `levels` whose date page may differ
+    after the rows on the `changed` dates were written.
+
+    A date page shows the latest reading of each lake on or before its
+    date. A changed row can therefore only show up on pages from its own
+    date up to the day before every lake has a later reading.
+
+    Inputs
+    ------
+    levels : pd.DataFrame
+        Levels reindexed to one row per calendar day.
+    changed : pd.DatetimeIndex
+        Dates of the rows written since the last build.
+    """
+    n = levels.shape[0]
+    days = np.arange(n)
+    # First day strictly after each day that every lake has a reading by.
+    covered = np.zeros(n, dtype=int)
+    for lake in levels.columns:
+        valid_from = np.where(levels[lake].notnull(), days, n)
+        next_valid = np.minimum.accumulate(valid_from[::-1])[::-1]
+        covered = np.maximum(covered, np.append(next_valid[1:], n))
+    starts = levels.index.get_indexer(changed)
+    starts = starts[starts >= 0]
+    boundaries = np.zeros(n + 1, dtype=int)
+    np.add.at(boundaries, starts, 1)
+    np.add.at(boundaries, covered[starts], -1)
+    return np.cumsum(boundaries[:-1]) > 0
+
+
+def main(out, full):
+    out = Path(out)
+    manifest_path = out / 'manifest.json'
+    # Read the version first, so anything written while building has a
+    # higher version and is picked up next time.
+    version = site.lldb.data_version()
+    df = site.lldb.to_df()
+    if df.empty:
+        print('No data to build the site from.')
+        return
+    levels = df.reindex(pd.date_range(df.index.min(), df.index.max()))
+
+    if not full and manifest_path.exists():
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        changed = site.lldb.changed_since(manifest['version'])
+        rebuild = affected_days(levels, changed)
+    else:
+        rebuild = np.ones(levels.shape[0], dtype=bool)
+    print(f'Rendering {rebuild.sum()} of {levels.shape[0]} date pages')
+
+    shutil.copytree(Path(site.app.root_path) / 'static', out / 'static',
+                    dirs_exist_ok=True)
+    windows = {}
+    series_url = static_series_url(windows)
+    write(out, 'plot-year.js', (
+        "document.addEventListener('DOMContentLoaded', function() {\n"
+        "    Bokeh.embed.embed_item(%s);\n"
+        "});\n"
+    ) % json.dumps(json_item(site.plot_year_tabs(series_url), _PLOT_TARGET)))
+
+    latest = levels.ffill()
+    with site.app.test_request_context():
+        write(out, 'index.html',
+              site._main_page(latest.iloc[[-1]], plot=_PLOT))
+        # Zooming in loads finer data from /api/series, so the static
+        # timeline only has the overview.
+        write(out, 'plot-timeline.html',
+              site._plot_timeline_page(series_url, zoom=False))
+        for date in levels.index[rebuild]:
+            write(out, f'date/{date.date().isoformat()}.html',
+                  site._main_page(latest.loc[[date]],
+                                  date=site._date_header(date), plot=_PLOT))
+
+    series = site.lldb.series()
+    for path, (start, end, points) in windows.items():
+        write(out, path, site.series_body(series.between(start, end), points,
+                                          'base64'))
+
+    manifest = {
+        'version': version,
+        'first': levels.index[0].date().isoformat(),
+        'last': levels.index[-1].date().isoformat(),
+    }
+    tmp = manifest_path.with_name(manifest_path.name + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp, manifest_path)
+
+
+if __name__ == '__main__':
+    p = build_parser()
+    args = p.parse_args()
+    main(args.out, args.full)
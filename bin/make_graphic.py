@@ -11,7 +11,7 @@ import matplotlib
 import madison_lake_levels as mll
 
 def main():
-    lldb = mll.db.LakeLevelDB(**mll.db.config_from_dburl(os.getenv('DATABASE_URL')))
+    lldb = mll.db.connect(os.getenv('DATABASE_URL'))
     req = mll.required_levels.required_levels
     df = lldb.to_df()
     df = df[df.columns[::-1]]
@@ -2,6 +2,7 @@
 import argparse
 from datetime import datetime as dt
 from datetime import timedelta
+import time
 
 import requests
 
@@ -9,11 +10,43 @@ import requests
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser()
     parser.add_argument('--full', action='store_true', help='Full scrape.')
+    parser.add_argument('--gaps', action='store_true',
+                        help='Only scrape the days with missing levels.')
+    parser.add_argument('--build-static', metavar='OUT',
+                        help='Once the queued scrapes have finished, update'
+                             ' the static site in OUT. Needs DATABASE_URL,'
+                             ' see build_static.py.')
+    parser.add_argument('--poll-interval', type=float, default=5.0,
+                        help='Seconds between checks on the queued scrapes.')
     return parser
 
 
-def main(full_scrape):
+def status_urls(response: requests.Response) -> list:
+    """
+    Return the status URLs of the jobs an /update route queued.
+    """
+    response.raise_for_status()
+    body = response.json()
+    return [job['status_url'] for job in body.get('jobs', [body])]
+
+
+def wait_for_jobs(url, urls, poll_interval=5.0) -> list:
+    """
+    Poll the status of each job at `urls` on the site at `url` until all
+    of them are done or failed, and return their statuses.
+    """
+    while True:
+        statuses = [requests.get(url + status_url).json()
+                    for status_url in urls]
+        if all(status['status'] in ['done', 'failed']
+               for status in statuses):
+            return statuses
+        time.sleep(poll_interval)
+
+
+def main(full_scrape, build_static=None, gaps=False, poll_interval=5.0):
     url = 'http://www.yahara.info'
+    urls = []
     if full_scrape:
         start_dt = dt(2007, 10, 1)
         end_dt = dt.utcnow()
@@ -21,13 +54,25 @@ def main(full_scrape):
         while start_dt < end_dt:
             start = start_dt.isoformat()
             end = min(start_dt + step, end_dt).isoformat()
-            requests.post(url + f'/update/{start}/{end}')
+            urls += status_urls(
+                requests.post(url + f'/update/{start}/{end}')
+            )
             start_dt += step
+    elif gaps:
+        urls += status_urls(requests.post(url + '/update/gaps'))
     else:
-        requests.post(url + '/update')
+        urls += status_urls(requests.post(url + '/update'))
+    if build_static is not None:
+        # /update only queues the scrape, so wait for the worker to
+        # write the new levels before building from them.
+        for status in wait_for_jobs(url, urls, poll_interval):
+            if status['status'] == 'failed':
+                print(f'Job {status["id"]} failed:\n{status["error"]}')
+        import build_static as static
+        static.main(build_static, full=False)
 
 
 if __name__ == '__main__':
     p = build_parser()
     args = p.parse_args()
-    main(args.full)
+    main(args.full, args.build_static, args.gaps, args.poll_interval)
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+"""
+Run the backfill jobs queued by the web app's /update route.
+Uses the DATABASE_URL environment variable.
+"""
+import sys
+sys.path.append('..')
+
+import argparse
+import os
+
+import madison_lake_levels as mll
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--poll-interval', type=float, default=5.0,
+                        help='Seconds between checks of an empty queue.')
+    parser.add_argument('--once', action='store_true',
+                        help='Exit once the queue is empty.')
+    parser.add_argument('--workers', type=int, default=2,
+                        help='Number of concurrent requests to USGS.')
+    parser.add_argument('--rate', type=float, default=2.0,
+                        help='Maximum requests per second to USGS.')
+    return parser
+
+
+def main(poll_interval, once, workers, rate):
+    lldb = mll.db.connect(os.getenv('DATABASE_URL'))
+    queue = mll.jobs.job_queue(lldb)
+    mll.jobs.run_worker(queue, lldb, poll_interval=poll_interval, once=once,
+                        verbose=True, workers=workers, rate=rate)
+
+
+if __name__ == '__main__':
+    p = build_parser()
+    args = p.parse_args()
+    main(args.poll_interval, args.once, args.workers, args.rate)
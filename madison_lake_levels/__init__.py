@@ -1,3 +1,17 @@
-from . import scrape
-from . import required_levels
-from . import db
+import importlib
+
+# Submodules are imported on first use, e.g. `mll.scrape`, so a process
+# only pays for the dependencies (requests, pyarrow, ...) it touches.
+_submodules = ['scrape', 'required_levels', 'sites', 'db', 'sqlite_db',
+               'pool', 'cache', 'series', 'aligned', 'downsample', 'jobs',
+               'metrics']
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module(f'.{name}', __name__)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + _submodules)
@@ -0,0 +1,117 @@
+import calendar
+
+import numpy as np
+import pandas as pd
+
+from .series import LakeSeries
+
+# Every year is laid out on a 365 day calendar. February 29th has no slot,
+# readings from it are dropped and March 1st is always day 59 (0-based).
+DAYS_PER_YEAR = 365
+_FEB_29 = 59
+
+
+def day_of_year(index: pd.DatetimeIndex) -> np.ndarray:
+    """
+    Return the 0-based slot of each date on the 365 day calendar.
+    February 29th maps to -1.
+    """
+    day = index.dayofyear.values - 1
+    leap = np.asarray(index.is_leap_year)
+    return np.where(leap & (day == _FEB_29), -1,
+                    day - (leap & (day > _FEB_29)))
+
+
+def year_dates(year: int) -> pd.DatetimeIndex:
+    """
+    Return the date of every slot in `year`, skipping February 29th.
+    """
+    slots = np.arange(DAYS_PER_YEAR)
+    days = slots + (calendar.isleap(year) & (slots >= _FEB_29))
+    return pd.DatetimeIndex(np.datetime64(f'{year}-01-01') + days)
+
+
+def year_span(dates: pd.DatetimeIndex, years=None) -> tuple:
+    """
+    Return the calendar years in the sorted `dates`, oldest first, and
+    the slot of the latest date, or -1 if there are no dates. These are
+    the `years` and `last_day` of a YearAligned built from the same
+    dates, found without laying out the heights.
+
+    Inputs
+    ------
+    dates : pd.DatetimeIndex
+        Increasing dates, as returned by `LakeSeries.dates`.
+    years : int | None
+        Only keep this many of the most recent calendar years.
+    """
+    all_years = np.unique(dates.year.values)
+    if years is not None and all_years.size:
+        all_years = all_years[all_years > all_years.max() - years]
+    if not all_years.size:
+        return all_years, -1
+    latest = dates[dates.year == all_years[-1]]
+    return all_years, int(max(day_of_year(latest).max(), 0))
+
+
+class YearAligned():
+    def __init__(self, levels, years=None):
+        """
+        Lay out daily lake levels as a (year x day of year x lake) array so
+        that the same calendar day of every year lines up.
+
+        Inputs
+        ------
+        levels : LakeSeries | pd.DataFrame
+            Daily levels as returned by `LakeLevelDB.series`, or a
+            DataFrame with a DatetimeIndex and a column per lake, as
+            returned by `LakeLevelDB.to_df`.
+        years : int | None
+            Only keep this many of the most recent calendar years.
+
+        Attributes
+        ----------
+        years : np.ndarray
+            The calendar years that have data, oldest first.
+        lakes : list of str
+            The lakes, in the order of the last axis of `values`.
+        values : np.ndarray
+            float32 heights of shape (len(years), DAYS_PER_YEAR,
+            len(lakes)). Days without data are NaN.
+        last_day : int
+            Slot of the latest date in `levels`, or -1 if it is empty.
+        """
+        if isinstance(levels, pd.DataFrame):
+            levels = LakeSeries.from_frame(levels)
+        self.lakes = list(levels.lakes)
+        index = levels.dates()
+        heights = levels.values
+        all_years = index.year.values
+        if years is not None and all_years.size:
+            keep = all_years > all_years.max() - years
+            index = index[keep]
+            heights = heights[:, keep]
+            all_years = all_years[keep]
+        self.years, row = np.unique(all_years, return_inverse=True)
+        day = day_of_year(index)
+        self.values = np.full(
+            (self.years.size, DAYS_PER_YEAR, len(self.lakes)), np.nan,
+            dtype=np.float32
+        )
+        on_calendar = day >= 0
+        self.values[row[on_calendar], day[on_calendar]] = (
+            heights[:, on_calendar].T
+        )
+        self.last_day = year_span(index)[1]
+
+    def dates(self, year: int) -> pd.DatetimeIndex:
+        """
+        Return the date of every slot in `year`, skipping February 29th.
+        """
+        return year_dates(year)
+
+    def lake(self, lake: str) -> np.ndarray:
+        """
+        Return a (year x day of year) view of the heights of `lake`.
+        """
+        return self.values[:, :, self.lakes.index(lake)]
@@ -0,0 +1,42 @@
+from collections import OrderedDict
+import threading
+
+
+class VersionedCache():
+    def __init__(self, maxsize=128):
+        """
+        A thread-safe, least-recently-used cache of values that are only
+        valid for one version of the data, see `LakeLevelDB.data_version`.
+
+        Inputs
+        ------
+        maxsize : int
+            Maximum number of keys to hold on to.
+        """
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version, compute):
+        """
+        Return the value stored under `key` if it was computed for
+        `version`, otherwise call `compute()` and store its result.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        value = compute()
+
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Pick `n_out` of the points (x, y) that preserve the visual shape of the
+    line through them, using Largest-Triangle-Three-Buckets
+    (Steinarsson, 2013).
+
+    The first and last points are always kept. The points in between are
+    split into `n_out - 2` buckets, and from each bucket the point that
+    forms the largest triangle with the previously kept point and the
+    average of the next bucket is kept.
+
+    Inputs
+    ------
+    x : np.ndarray
+        Increasing x coordinates.
+    y : np.ndarray
+        y coordinates, must not contain NaN.
+    n_out : int
+        Number of points to keep.
+
+    Returns
+    -------
+    indices : np.ndarray
+        Sorted indices of the kept points. All of them if there are no
+        more than `n_out` points.
+    """
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    out = np.empty(n_out, dtype=int)
+    out[0] = 0
+    out[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        cx = x[hi:next_hi].mean()
+        cy = y[hi:next_hi].mean()
+        area = np.abs(
+            (x[a] - cx) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (cy - y[a])
+        )
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def downsample_rows(x: np.ndarray, columns: np.ndarray,
+                    n_out: int) -> np.ndarray:
+    """
+    Return the positions needed to draw each of `columns` against `x`
+    with about `n_out` points, see `lttb`.
+
+    Each column is downsampled separately and the union of the kept
+    positions is returned, so all columns can share one x axis. The first
+    missing value after a reading is also kept so that gaps in the data
+    still break the line.
+
+    Inputs
+    ------
+    x : np.ndarray
+        Increasing x coordinates.
+    columns : np.ndarray
+        y coordinates of shape (number of columns, len(x)). Missing values
+        are NaN.
+    n_out : int
+        Number of points to keep per column.
+    """
+    keep = [np.empty(0, dtype=int)]
+    for y in columns:
+        valid = ~np.isnan(y)
+        positions = np.flatnonzero(valid)
+        keep.append(positions[lttb(x[positions], y[positions], n_out)])
+        keep.append(np.flatnonzero(~valid[1:] & valid[:-1]) + 1)
+    return np.unique(np.concatenate(keep)).astype(int)
+
+
+def downsample(df: pd.DataFrame, n_out: int) -> pd.DataFrame:
+    """
+    Return the rows of `df` needed to draw each column with about `n_out`
+    points, see `downsample_rows`.
+
+    Inputs
+    ------
+    df : pd.DataFrame
+        DataFrame with a sorted DatetimeIndex.
+    n_out : int
+        Number of points to keep per column.
+    """
+    return df.iloc[downsample_rows(df.index.asi8, df.values.T, n_out)]
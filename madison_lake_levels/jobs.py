@@ -0,0 +1,365 @@
+from datetime import datetime, timedelta, timezone
+import sqlite3
+import threading
+import time
+import traceback
+from typing import Union
+
+import pandas as pd
+import psycopg2
+
+from .db import LakeLevelDB
+
+# Job states. Queued jobs that are merged into another job when their
+# windows are coalesced become 'merged' and point at that job.
+STATES = ['queued', 'running', 'done', 'failed', 'merged']
+
+
+def _utc(ts) -> datetime:
+    # Naive timestamps are taken to be UTC.
+    ts = pd.Timestamp(ts)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize('UTC')
+    return ts.tz_convert('UTC').to_pydatetime()
+
+
+class JobQueue():
+    def __init__(self, lldb: LakeLevelDB, stale_after=3600.0):
+        """
+        A queue of backfill windows kept in the `jobs` table of the lake
+        level database, so that the web app can hand scraping off to
+        worker processes, see `run_worker`. Use `job_queue` to get the
+        queue class matching the database backend.
+
+        Inputs
+        ------
+        lldb : LakeLevelDB
+            Database holding the queue, whose connections are shared.
+        stale_after : float
+            A job that has been running for this many seconds is assumed
+            to belong to a worker that died, and is handed out again.
+
+        The table is created by the first operation if needed.
+        """
+        self._lldb = lldb
+        self._stale_after = stale_after
+        self._table_ready = False
+        self._table_lock = threading.Lock()
+
+    def _create_if_nonexistent(self):
+        with self._begin(write=True) as cursor:
+            cursor.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id bigserial PRIMARY KEY,"
+                " start_dt timestamptz NOT NULL,"
+                " end_dt timestamptz NOT NULL,"
+                " status text NOT NULL DEFAULT 'queued',"
+                " merged_into bigint REFERENCES jobs (id),"
+                " created timestamptz NOT NULL DEFAULT now(),"
+                " started timestamptz,"
+                " finished timestamptz,"
+                " error text);"
+                " CREATE INDEX IF NOT EXISTS jobs_queued_idx ON jobs (id)"
+                "  WHERE status = 'queued';"
+            )
+
+    # The SQL below is shared with SQLiteJobQueue, which overrides these.
+
+    # Appended to the query that picks the job to claim.
+    _claim_lock = ' FOR UPDATE SKIP LOCKED'
+
+    # Errors a worker waits out and tries again after, see `run_worker`.
+    db_errors = (psycopg2.Error,)
+
+    def _transaction(self, write=False):
+        if not self._table_ready:
+            with self._table_lock:
+                if not self._table_ready:
+                    self._create_if_nonexistent()
+                    self._table_ready = True
+        return self._begin(write)
+
+    def _begin(self, write=False):
+        return self._lldb._transaction()
+
+    def _lock(self, cursor):
+        # Taken before touching any rows by both enqueue and claim, which
+        # therefore take turns. Without it an enqueuer coalescing a job
+        # a worker has just row-locked, and that worker marking the job
+        # running, would each wait for the other.
+        cursor.execute('LOCK TABLE jobs IN SHARE ROW EXCLUSIVE MODE')
+
+    def _execute(self, cursor, cmd, params=()):
+        cursor.execute(cmd, params)
+
+    def _insert(self, cursor, start, end) -> int:
+        cursor.execute(
+            'INSERT INTO jobs (start_dt, end_dt) VALUES (%s, %s) RETURNING id',
+            (start, end)
+        )
+        return cursor.fetchone()[0]
+
+    def _to_db(self, ts: datetime):
+        return ts
+
+    def _from_db(self, value) -> datetime:
+        return value
+
+    def enqueue(self, start, end) -> int:
+        """
+        Queue a backfill of `start` through `end` and return the id of
+        the job that will cover it.
+
+        If a queued or running job already covers the window, its id is
+        returned. Queued jobs whose windows overlap or touch the new one
+        are coalesced into a single job covering all of them, so a burst
+        of requests for consecutive windows becomes one backfill.
+
+        Inputs
+        ------
+        start : datetime-like
+            Start of the window, naive timestamps are UTC.
+        end : datetime-like
+            End of the window, naive timestamps are UTC.
+        """
+        start, end = _utc(start), _utc(end)
+        if end < start:
+            raise ValueError('end must not be before start.')
+        with self._transaction(write=True) as cursor:
+            self._lock(cursor)
+            self._execute(
+                cursor,
+                "SELECT id FROM jobs"
+                " WHERE status IN ('queued', 'running')"
+                "  AND start_dt <= %s AND end_dt >= %s"
+                " ORDER BY id LIMIT 1", (self._to_db(start), self._to_db(end))
+            )
+            row = cursor.fetchone()
+            if row is not None:
+                return row[0]
+
+            self._execute(
+                cursor,
+                "SELECT id, start_dt, end_dt FROM jobs"
+                " WHERE status = 'queued'"
+                "  AND start_dt <= %s AND end_dt >= %s"
+                " ORDER BY id", (self._to_db(end), self._to_db(start))
+            )
+            touching = [(i, self._from_db(s), self._from_db(e))
+                        for i, s, e in cursor.fetchall()]
+            if not touching:
+                return self._insert(cursor, self._to_db(start),
+                                    self._to_db(end))
+
+            job_id = touching[0][0]
+            start = min([start] + [s for _, s, _ in touching])
+            end = max([end] + [e for _, _, e in touching])
+            self._execute(
+                cursor,
+                'UPDATE jobs SET start_dt = %s, end_dt = %s WHERE id = %s',
+                (self._to_db(start), self._to_db(end), job_id)
+            )
+            now = self._to_db(datetime.now(timezone.utc))
+            for other, _, _ in touching[1:]:
+                self._execute(
+                    cursor,
+                    "UPDATE jobs SET status = 'merged', merged_into = %s,"
+                    " finished = %s WHERE id = %s", (job_id, now, other)
+                )
+            return job_id
+
+    def claim(self) -> Union[tuple, None]:
+        """
+        Mark the oldest queued job as running and return
+        `(id, start, end)`, or `None` if there is nothing to do. Jobs
+        running for longer than `stale_after` seconds are reclaimed.
+        """
+        now = datetime.now(timezone.utc)
+        stale = now - timedelta(seconds=self._stale_after)
+        with self._transaction(write=True) as cursor:
+            self._lock(cursor)
+            self._execute(
+                cursor,
+                "SELECT id, start_dt, end_dt FROM jobs"
+                " WHERE status = 'queued'"
+                "  OR (status = 'running' AND started < %s)"
+                " ORDER BY id LIMIT 1" + self._claim_lock,
+                (self._to_db(stale),)
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            self._execute(
+                cursor,
+                "UPDATE jobs SET status = 'running', started = %s"
+                " WHERE id = %s", (self._to_db(now), row[0])
+            )
+        return row[0], self._from_db(row[1]), self._from_db(row[2])
+
+    def finish(self, job_id: int, error: Union[str, None] = None):
+        """
+        Record that a claimed job succeeded, or failed with `error`.
+        """
+        with self._transaction(write=True) as cursor:
+            self._execute(
+                cursor,
+                'UPDATE jobs SET status = %s, finished = %s, error = %s'
+                ' WHERE id = %s',
+                ('done' if error is None else 'failed',
+                 self._to_db(datetime.now(timezone.utc)), error, job_id)
+            )
+
+    def status(self, job_id: int) -> Union[dict, None]:
+        """
+        Return the state of a job as a dict, or `None` if there is no such
+        job. The status of a merged job is that of the job it was merged
+        into, whose id is under `'merged_into'`.
+        """
+        with self._transaction() as cursor:
+            self._execute(
+                cursor,
+                'WITH RECURSIVE chain AS ('
+                ' SELECT jobs.*, 0 AS depth FROM jobs WHERE id = %s'
+                ' UNION ALL'
+                ' SELECT jobs.*, chain.depth + 1 FROM jobs'
+                '  JOIN chain ON jobs.id = chain.merged_into'
+                ')'
+                ' SELECT id, start_dt, end_dt, status, created, started,'
+                '  finished, error'
+                ' FROM chain ORDER BY depth DESC LIMIT 1', (job_id,)
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        keys = ['id', 'start', 'end', 'status', 'created', 'started',
+                'finished', 'error']
+        job = dict(zip(keys, row))
+        for key in ['start', 'end', 'created', 'started', 'finished']:
+            if job[key] is not None:
+                job[key] = self._from_db(job[key]).isoformat()
+        if job['id'] != job_id:
+            job['merged_into'] = job['id']
+            job['id'] = job_id
+        return job
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    JobQueue for a `SQLiteLakeLevelDB`. Timestamps are stored as ISO 8601
+    text in UTC, which sorts in time order. Every change takes the
+    database's write lock, so workers claim jobs one at a time.
+    """
+
+    _claim_lock = ''
+
+    db_errors = (sqlite3.Error,)
+
+    def _create_if_nonexistent(self):
+        with self._begin(write=True) as cursor:
+            cursor.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " start_dt TEXT NOT NULL,"
+                " end_dt TEXT NOT NULL,"
+                " status TEXT NOT NULL DEFAULT 'queued',"
+                " merged_into INTEGER REFERENCES jobs (id),"
+                " created TEXT NOT NULL,"
+                " started TEXT,"
+                " finished TEXT,"
+                " error TEXT)"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_queued_idx ON jobs (id)"
+                " WHERE status = 'queued'"
+            )
+
+    def _begin(self, write=False):
+        return self._lldb._transaction(write=write)
+
+    def _lock(self, cursor):
+        pass
+
+    def _execute(self, cursor, cmd, params=()):
+        cursor.execute(cmd.replace('%s', '?'), params)
+
+    def _insert(self, cursor, start, end) -> int:
+        cursor.execute(
+            'INSERT INTO jobs (start_dt, end_dt, created) VALUES (?, ?, ?)',
+            (start, end, self._to_db(datetime.now(timezone.utc)))
+        )
+        return cursor.lastrowid
+
+    def _to_db(self, ts: datetime):
+        return ts.astimezone(timezone.utc).isoformat(timespec='microseconds')
+
+    def _from_db(self, value) -> datetime:
+        return datetime.fromisoformat(value)
+
+
+def job_queue(lldb: LakeLevelDB, **kwargs) -> JobQueue:
+    """
+    Return the job queue kept in `lldb`, see `JobQueue`. Keyword arguments
+    are passed on to the queue class.
+    """
+    if lldb.backend == 'sqlite':
+        return SQLiteJobQueue(lldb, **kwargs)
+    return JobQueue(lldb, **kwargs)
+
+
+def run_worker(queue: JobQueue, lldb: LakeLevelDB, poll_interval=5.0,
+               once=False, verbose=False, **backfill_kwargs):
+    """
+    Run queued backfill jobs until interrupted. If a job cannot be
+    claimed because of a database error, e.g. the database restarting,
+    the worker waits `poll_interval` seconds and tries again.
+
+    Inputs
+    ------
+    queue : JobQueue
+        Queue to take jobs from.
+    lldb : LakeLevelDB
+        Database to write the scraped data to.
+    poll_interval : float
+        Seconds to wait before looking again when the queue is empty.
+    once : bool
+        If truthy, return as soon as the queue is empty.
+    verbose : bool
+        If truthy, print progress.
+    **backfill_kwargs
+        Passed on to `scrape.backfill`, e.g. `workers` and `rate`.
+    """
+    while True:
+        try:
+            job = queue.claim()
+        except queue.db_errors as e:
+            if verbose:
+                print(f'Could not claim a job, retrying: {e}')
+            time.sleep(poll_interval)
+            continue
+        if job is None:
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+        _run_job(queue, lldb, job, verbose, **backfill_kwargs)
+
+
+def _run_job(queue: JobQueue, lldb: LakeLevelDB, job: tuple, verbose,
+             **backfill_kwargs):
+    """
+    Backfill the window of a claimed `(id, start, end)` job and record how
+    it went, see `run_worker`.
+    """
+    from . import scrape
+
+    job_id, start, end = job
+    if verbose:
+        print(f'Job {job_id}: backfilling {start} through {end}')
+    try:
+        scrape.backfill(start, end, lldb, verbose=verbose, **backfill_kwargs)
+    except Exception:
+        queue.finish(job_id, error=traceback.format_exc())
+        if verbose:
+            print(f'Job {job_id} failed')
+    else:
+        queue.finish(job_id)
@@ -0,0 +1,126 @@
+from contextlib import contextmanager
+import functools
+import threading
+import time
+
+# Upper bounds, in seconds, of the histogram buckets. Same as the
+# Prometheus client defaults.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+           float('inf'))
+
+_HELP = {
+    'mll_span_seconds': 'Time spent in instrumented operations.',
+    'mll_request_seconds': 'Time spent handling HTTP requests.',
+}
+
+_histograms = {}  # (metric, sorted label items) -> [bucket counts, sum]
+_histograms_lock = threading.Lock()
+_local = threading.local()
+
+
+def observe(metric: str, seconds: float, **labels):
+    """
+    Add one observation of `seconds` to the histogram `metric` with the
+    given labels.
+    """
+    key = (metric, tuple(sorted(labels.items())))
+    with _histograms_lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * len(BUCKETS), 0.0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram[0][i] += 1
+                break
+        histogram[1] += seconds
+
+
+@contextmanager
+def span(name: str):
+    """
+    Time the block and record it in the `mll_span_seconds` histogram
+    under `name`. If a trace is being collected on this thread, see
+    `trace`, the span is added to it too.
+    """
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - t0
+        observe('mll_span_seconds', seconds, span=name)
+        spans = getattr(_local, 'spans', None)
+        if spans is not None:
+            spans.append((name, seconds))
+
+
+def timed(name: str):
+    """
+    Decorator that wraps every call of a function in `span(name)`.
+    """
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start_trace():
+    """
+    Start collecting the spans finished on this thread.
+    """
+    _local.spans = []
+
+
+def end_trace() -> list:
+    """
+    Stop collecting spans and return the collected `(name, seconds)`
+    pairs, in the order they finished.
+    """
+    spans = getattr(_local, 'spans', None)
+    _local.spans = None
+    return spans or []
+
+
+def _format_labels(labels) -> str:
+    def escape(value):
+        return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+                .replace('\n', '\\n'))
+    return ','.join(f'{key}="{escape(value)}"' for key, value in labels)
+
+
+def render_prometheus() -> str:
+    """
+    Return all histograms in the Prometheus text exposition format.
+    """
+    with _histograms_lock:
+        histograms = sorted(
+            (key, (list(counts), total))
+            for key, (counts, total) in _histograms.items()
+        )
+    lines = []
+    current = None
+    for (metric, labels), (counts, total) in histograms:
+        if metric != current:
+            current = metric
+            lines.append(f'# HELP {metric} {_HELP.get(metric, metric)}')
+            lines.append(f'# TYPE {metric} histogram')
+        cumulative = 0
+        for bound, count in zip(BUCKETS, counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            bucket_labels = _format_labels(labels + (('le', le),))
+            lines.append(f'{metric}_bucket{{{bucket_labels}}} {cumulative}')
+        label_text = _format_labels(labels)
+        lines.append(f'{metric}_sum{{{label_text}}} {total!r}')
+        lines.append(f'{metric}_count{{{label_text}}} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """
+    Forget all observations.
+    """
+    with _histograms_lock:
+        _histograms.clear()
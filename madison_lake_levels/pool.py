@@ -0,0 +1,177 @@
+from contextlib import contextmanager
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+
+
+class PoolTimeout(psycopg2.pool.PoolError):
+    pass
+
+
+class ConnectionPool():
+    def __init__(self, maxconn=1, timeout=30.0, health_check_interval=30.0,
+                 **config):
+        """
+        A bounded, thread-safe pool of psycopg2 connections.
+
+        Connections are opened on demand up to `maxconn`. Checking out a
+        connection when all of them are busy waits up to `timeout` seconds
+        before raising a PoolTimeout.
+
+        A connection that has sat idle for longer than
+        `health_check_interval` seconds is pinged before being handed
+        out, and replaced with a fresh one if the ping fails. Connections
+        that raise an OperationalError or InterfaceError while checked
+        out are discarded, so a database restart only costs the requests
+        that were in flight.
+
+        Arguments in **config will be passed directly to `psycopg2.connect`.
+        """
+        self._config = config
+        self._maxconn = maxconn
+        self._timeout = timeout
+        self._health_check_interval = health_check_interval
+
+        self._cond = threading.Condition()
+        self._idle = []  # (connection, time it was checked in)
+        self._size = 0
+        self._in_use = 0
+
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+        self._reconnects = 0
+
+    @contextmanager
+    def connection(self):
+        """
+        Check out a connection for the duration of the `with` block.
+        """
+        conn = self._checkout()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self._checkin(conn, broken)
+
+    def _checkout(self):
+        start = time.monotonic()
+        with self._cond:
+            while not self._idle and self._size >= self._maxconn:
+                remaining = start + self._timeout - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f'No connection available after {self._timeout}s'
+                        f' ({self._maxconn} in use).'
+                    )
+                self._cond.wait(remaining)
+            waited = time.monotonic() - start
+            self._checkouts += 1
+            if waited > 0.001:
+                self._waits += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            if self._idle:
+                conn, last_used = self._idle.pop()
+            else:
+                # reserve a slot, the connection is opened outside the lock
+                conn, last_used = None, None
+                self._size += 1
+            self._in_use += 1
+
+        try:
+            if conn is None:
+                conn = psycopg2.connect(**self._config)
+            elif conn.closed or (
+                time.monotonic() - last_used > self._health_check_interval
+                and not self._is_healthy(conn)
+            ):
+                self._close(conn)
+                conn = psycopg2.connect(**self._config)
+                with self._cond:
+                    self._reconnects += 1
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def _checkin(self, conn, broken=False):
+        if not broken and not conn.closed:
+            status = conn.get_transaction_status()
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                broken = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+        with self._cond:
+            self._in_use -= 1
+            if broken or conn.closed:
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+        if broken:
+            self._close(conn)
+
+    @staticmethod
+    def _is_healthy(conn) -> bool:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def stats(self) -> dict:
+        """
+        Return counters describing the pool, useful for sizing the number
+        of workers against the database's connection limit.
+
+        Wait times are in seconds. A checkout counts as having waited if
+        it spent more than a millisecond waiting for a free connection.
+        """
+        with self._cond:
+            return {
+                'max_size': self._maxconn,
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_time_total': self._wait_total,
+                'wait_time_max': self._wait_max,
+                'timeouts': self._timeouts,
+                'reconnects': self._reconnects,
+            }
+
+    def close(self):
+        """
+        Close all idle connections.
+        """
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for conn, _ in idle:
+            self._close(conn)
@@ -1,7 +1,15 @@
 from pathlib import Path
 
-import pandas as pd
-
 _data_path = Path(__file__).parent / 'data'
-required_levels = pd.read_csv(_data_path / 'required_levels.csv')
-required_levels.set_index('lake', drop=True, inplace=True)
+
+
+def __getattr__(name):
+    # The table is read the first time `required_levels` is used.
+    if name == 'required_levels':
+        import pandas as pd
+
+        global required_levels
+        required_levels = pd.read_csv(_data_path / 'required_levels.csv')
+        required_levels.set_index('lake', drop=True, inplace=True)
+        return required_levels
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -1,10 +1,16 @@
+import hashlib
 import json
 import io
-import functools
+import os
+from pathlib import Path
+import random
+import tempfile
+import threading
 import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 import requests
-import pytz
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
@@ -12,26 +18,152 @@ from datetime import datetime, timedelta
 from typing import Union
 
 from .db import LakeLevelDB
+from .sites import LAKES
+from . import metrics
 
-# See https://waterdata.usgs.gov/wi/nwis/current/?type=dane&group_key=NONE
 lake_name_to_usgs_site_num = {
-    'MENDOTA': '05428000',
-    'MONONA': '05429000',
-    'WAUBESA': '05429485',
-    'KEGONSA': '425715089164700'
+    name.upper(): site_num for name, site_num in LAKES.items()
 }
 
+# Most sites asked of USGS in one request. Longer lists are split up.
+sites_per_request = 100
+
+
+# Value USGS reports for readings that are missing, e.g. during an
+# equipment malfunction.
+_usgs_no_data_value = -999999.0
+
+
+# Settings for requests to USGS. Timeouts are (connect, read) seconds.
+# Failed requests are retried up to http_max_retries times, waiting a
+# random time up to http_backoff * 2 ** attempt seconds (capped at
+# http_backoff_max) before each retry.
+http_timeout = (10.0, 120.0)
+http_max_retries = 4
+http_backoff = 0.5
+http_backoff_max = 30.0
+
+# USGS water services endpoints. Overridable to point at a stand-in
+# server, e.g. the one in benchmarks/fake_usgs.py.
+usgs_iv_url = os.getenv(
+    'USGS_IV_URL', 'http://waterservices.usgs.gov/nwis/iv/'
+)
+usgs_site_url = os.getenv(
+    'USGS_SITE_URL', 'https://waterservices.usgs.gov/nwis/site/'
+)
+
+# Where datum elevations are cached, and for how many seconds.
+datum_cache_dir = Path(os.getenv(
+    'MLL_CACHE_DIR', Path(tempfile.gettempdir()) / 'madison_lake_levels'
+))
+datum_cache_ttl = 30 * 24 * 60 * 60
+# While USGS is unreachable, seconds to keep using a stale copy before
+# trying again.
+datum_retry_after = 5 * 60
+
+# url + sites -> (time fetched, time to retry USGS after, datum dataframe)
+_datum_memory = {}
+_datum_lock = threading.Lock()
+
+_session = None
+_session_lock = threading.Lock()
+_http_stats = {}
+_http_stats_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    """
+    Return the process-wide session, so connections to USGS are kept
+    alive and reused across requests and threads.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=16)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+            _session.headers['Accept-Encoding'] = 'gzip, deflate'
+        return _session
+
+
+def _record_http(endpoint, latency, retried=False, failed=False):
+    with _http_stats_lock:
+        stats = _http_stats.setdefault(endpoint, {
+            'requests': 0, 'retries': 0, 'failures': 0,
+            'latency_total': 0.0, 'latency_max': 0.0,
+        })
+        stats['requests'] += 1
+        stats['retries'] += retried
+        stats['failures'] += failed
+        stats['latency_total'] += latency
+        stats['latency_max'] = max(stats['latency_max'], latency)
+
+
+def http_stats() -> dict:
+    """
+    Return counters for the requests made to each USGS endpoint ('iv'
+    and 'site'). Every attempt counts as a request. Latencies are in
+    seconds.
+    """
+    with _http_stats_lock:
+        return {endpoint: dict(stats)
+                for endpoint, stats in _http_stats.items()}
+
+
+def reset_http_stats():
+    with _http_stats_lock:
+        _http_stats.clear()
+
+
+def _request(endpoint: str, url: str) -> requests.Response:
+    """
+    POST to a USGS endpoint through the shared session, retrying with
+    jittered exponential backoff on connection errors, timeouts and 5xx
+    responses. Other error responses raise immediately.
+    """
+    session = _get_session()
+    for attempt in range(http_max_retries + 1):
+        t0 = time.perf_counter()
+        try:
+            with metrics.span(f'usgs.{endpoint}'):
+                r = session.post(url, timeout=http_timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+        else:
+            if r.status_code < 500:
+                _record_http(endpoint, time.perf_counter() - t0,
+                             failed=not r.ok)
+                r.raise_for_status()
+                return r
+            error = requests.HTTPError(
+                f'{r.status_code} Server Error for url: {url}', response=r
+            )
+        last_attempt = attempt == http_max_retries
+        _record_http(endpoint, time.perf_counter() - t0,
+                     retried=not last_attempt, failed=last_attempt)
+        if last_attempt:
+            raise error
+        time.sleep(random.uniform(
+            0, min(http_backoff_max, http_backoff * 2 ** attempt)
+        ))
+
 
 def _format_usgs_lake_names(name):
     return name.split()[1].lower()
 
 
 def scrape(start: Union[datetime, None]=None,
-           end: Union[datetime, None]=None) -> pd.DataFrame:
+           end: Union[datetime, None]=None,
+           fmt: str='json',
+           sites: Union[dict, None]=None) -> pd.DataFrame:
     """
     Scrape Madison lake heights from public USGS data.
     Heights reported are the gage height + datum elevation.
 
+    Up to `sites_per_request` sites are fetched per request, along with
+    their datum elevations.
+
     Inputs
     ------
     start : datetime | None
@@ -41,12 +173,22 @@ def scrape(start: Union[datetime, None]=None,
     end : datetime | None
         End timestamp to collect data to. If `None` then go to
         the most recently reported data.
+    fmt : str
+        Format to request from USGS, either 'json' or 'rdb'
+        (tab-delimited). See `parse_iv_json` and `parse_iv_rdb`.
+    sites : dict | None
+        USGS site numbers by name, e.g. from `LakeLevelDB.sites`. If
+        `None`, the four lakes.
 
     Returns
     -------
     df : pandas.DataFrame
-        A pandas dataframe of lake heights. Each lake has a column.
+        A pandas dataframe of lake heights. Each site has a column,
+        named by the keys of `sites`.
     """
+    if fmt not in _iv_parsers:
+        raise ValueError(f'fmt must be one of {list(_iv_parsers)}.')
+
     date_format = '%Y-%m-%d'
     if start is None:
         start_arg = ''
@@ -60,38 +202,199 @@ def scrape(start: Union[datetime, None]=None,
     else:
         end_arg = '&endDT={}'.format(end.strftime(date_format))
 
-    sites = ','.join(lake_name_to_usgs_site_num.values())
+    if sites is None:
+        sites = LAKES
+    items = list(sites.items())
+    frames = []
+    for i in range(0, len(items), sites_per_request):
+        batch = dict(items[i:i + sites_per_request])
+        site_nums = ','.join(batch.values())
 
-    base_url = 'http://waterservices.usgs.gov/nwis/iv/?'
-    url_args = f'&sites={sites}&format=json{start_arg}{end_arg}'
+        base_url = usgs_iv_url + '?'
+        url_args = f'&sites={site_nums}&format={fmt}{start_arg}{end_arg}'
 
-    r = requests.post(base_url + url_args)
-    d = json.loads(r.text)
-    df = pd.DataFrame({})
+        r = _request('iv', base_url + url_args)
+        with metrics.span(f'usgs.parse_{fmt}'):
+            df = _iv_parsers[fmt](r.text, batch)
+
+        datum = get_datum_elevation(site_nums)
+        datum_elevation = datum.set_index('site_no')['alt_va']
+
+        for name, site_num in batch.items():
+            df[name] += datum_elevation[site_num]
+        frames.append(df)
+
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, axis=1, sort=True)
+
+
+def _lake_frame(series: dict, lakes) -> pd.DataFrame:
+    """
+    Combine per-lake series of gage heights into one dataframe with a
+    column for every lake in `lakes`, aligned on a sorted UTC
+    DatetimeIndex.
+    """
+    if series:
+        df = pd.concat(series, axis=1, sort=True)
+    else:
+        df = pd.DataFrame(index=pd.DatetimeIndex([], tz='UTC'))
+    return df.reindex(columns=lakes).astype(float)
+
+
+def _parse_usgs_timestamps(times: np.ndarray) -> pd.DatetimeIndex:
+    """
+    Convert an array of timestamps like '2019-04-01T00:15:00.000-05:00'
+    to a UTC DatetimeIndex.
+
+    pandas falls back to parsing one string at a time when the UTC offset
+    varies, as it does across daylight saving time. These timestamps have
+    a fixed layout, so instead every field is read straight out of the
+    character codes with NumPy arithmetic.
+    """
+    width = len('2019-04-01T00:15:00.000-05:00')
+    if times.dtype != np.dtype(f'U{width}'):
+        return pd.DatetimeIndex(pd.to_datetime(times, utc=True))
+    # Unicode code points of each character, one row per timestamp.
+    chars = times.view(np.uint32).reshape(-1, width).astype(np.int64)
+    if not (
+        (chars[:, 10] == ord('T')).all()
+        & np.isin(chars[:, 23], [ord('+'), ord('-')]).all()
+    ):
+        return pd.DatetimeIndex(pd.to_datetime(times, utc=True))
+    d = chars - ord('0')
+
+    def number(first, last):
+        n = d[:, first]
+        for i in range(first + 1, last):
+            n = n * 10 + d[:, i]
+        return n
+
+    months = (number(0, 4) - 1970) * 12 + number(5, 7) - 1
+    days = months.astype('datetime64[M]').astype('datetime64[D]')
+    ms = (
+        (number(8, 10) - 1) * 86400000
+        + number(11, 13) * 3600000
+        + number(14, 16) * 60000
+        + number(17, 19) * 1000
+        + number(20, 23)
+    )
+    offset = number(24, 26) * 60 + number(27, 29)
+    offset = np.where(chars[:, 23] == ord('-'), -offset, offset)
+    utc = (
+        days.astype('datetime64[ms]')
+        + (ms - offset * 60000).astype('timedelta64[ms]')
+    )
+    return pd.DatetimeIndex(utc.astype('datetime64[ns]')).tz_localize('UTC')
+
+
+def parse_iv_json(text: str, sites: Union[dict, None]=None) -> pd.DataFrame:
+    """
+    Parse a USGS instantaneous values response in JSON format.
+
+    The readings of each time series are converted to NumPy arrays in
+    one pass, and missing values and timestamps are handled with
+    vectorized operations rather than per reading.
+
+    Inputs
+    ------
+    text : str
+        The response body.
+    sites : dict | None
+        USGS site numbers by name of the sites requested, see `scrape`.
+
+    Returns
+    -------
+    df : pandas.DataFrame
+        Gage heights with a column per site and a UTC DatetimeIndex.
+        Sites with no readings are all NaN.
+    """
+    if sites is None:
+        sites = LAKES
+    site_num_to_name = {num: name for name, num in sites.items()}
+    d = json.loads(text)
+    series = {}
     for ts in d['value']['timeSeries']:
-        lake_name = _format_usgs_lake_names(ts['sourceInfo']['siteName'])
+        site_num = ts['sourceInfo']['siteCode'][0]['value']
+        lake_name = site_num_to_name[site_num]
         values = ts['values'][0]['value']
         null_value = ts['variable']['noDataValue']
-        values = [v for v in values if float(v['value']) != null_value]
-        gage_heights = [float(v['value']) for v in values]
-        times = [v['dateTime'] for v in values]
-        df[lake_name] = pd.Series(dict(zip(times, gage_heights)))
+        gage_heights = np.array([v['value'] for v in values], dtype=float)
+        times = np.array([v['dateTime'] for v in values], dtype=str)
+        keep = gage_heights != null_value
+        s = pd.Series(
+            gage_heights[keep],
+            index=_parse_usgs_timestamps(times[keep]),
+        )
+        series[lake_name] = s[~s.index.duplicated(keep='last')]
+    return _lake_frame(series, sites)
 
-    for lake_name in lake_name_to_usgs_site_num.keys():
-        if lake_name.lower() not in df.columns:
-            df[lake_name.lower()] = np.nan
 
-    datum = get_datum_elevation(sites)
+# UTC offsets of the time zone codes USGS uses in RDB files.
+_tz_cd_offsets = {
+    'UTC': 0, 'EST': -5, 'EDT': -4, 'CST': -6, 'CDT': -5,
+    'MST': -7, 'MDT': -6, 'PST': -8, 'PDT': -7,
+}
 
-    for name, datum_elevation in datum['alt_va'].iteritems():
-        df[name] += datum_elevation
 
-    df.index = pd.to_datetime(df.index, utc=True)
+def parse_iv_rdb(text: str, sites: Union[dict, None]=None) -> pd.DataFrame:
+    """
+    Parse a USGS instantaneous values response in RDB (tab-delimited)
+    format. Each site's block is read with pandas' C CSV reader.
 
-    return df
+    Inputs
+    ------
+    text : str
+        The response body.
+    sites : dict | None
+        USGS site numbers by name of the sites requested, see `scrape`.
+
+    Returns
+    -------
+    df : pandas.DataFrame
+        Gage heights with a column per site and a UTC DatetimeIndex.
+        Sites with no readings are all NaN.
+    """
+    if sites is None:
+        sites = LAKES
+    site_num_to_lake_name = {num: name for name, num in sites.items()}
+    lines = [line for line in text.split('\n') if not line.startswith('#')]
+    headers = [i for i, line in enumerate(lines)
+               if line.startswith('agency_cd\t')]
+    series = {}
+    for block_start, block_end in zip(headers, headers[1:] + [len(lines)]):
+        block = pd.read_csv(
+            io.StringIO('\n'.join(lines[block_start:block_end])),
+            sep='\t', skiprows=[1], dtype={'site_no': str}
+        )
+        value_columns = [c for c in block.columns
+                         if c.endswith('_00065') and c[0].isdigit()]
+        if block.empty or not value_columns:
+            continue
+        gage_heights = pd.to_numeric(
+            block[value_columns[-1]], errors='coerce'
+        ).to_numpy()
+        local = pd.to_datetime(block['datetime'], format='%Y-%m-%d %H:%M')
+        offset_hours = block['tz_cd'].map(_tz_cd_offsets).to_numpy()
+        utc = local.to_numpy() - offset_hours.astype('timedelta64[h]')
+        for site_no in block['site_no'].unique():
+            keep = (
+                (block['site_no'] == site_no).to_numpy()
+                & ~np.isnan(gage_heights)
+                & (gage_heights != _usgs_no_data_value)
+            )
+            s = pd.Series(
+                gage_heights[keep],
+                index=pd.DatetimeIndex(utc[keep]).tz_localize('UTC'),
+            )
+            lake_name = site_num_to_lake_name[site_no]
+            series[lake_name] = s[~s.index.duplicated(keep='last')]
+    return _lake_frame(series, sites)
+
+
+_iv_parsers = {'json': parse_iv_json, 'rdb': parse_iv_rdb}
 
 
-@functools.lru_cache(maxsize=50)
 def get_datum_elevation(sites: str) -> pd.DataFrame:
     """
     Given a comma separated list of site numbers, return the datum
@@ -100,23 +403,76 @@ def get_datum_elevation(sites: str) -> pd.DataFrame:
     the lake level is the sum of the datum elevation and the sensor reading.
 
     This function is cached since the rate at which these values change has
-    historically been on the order of decades.
+    historically been on the order of decades. The USGS response is kept
+    on disk in `datum_cache_dir`, shared by every process on the machine,
+    and refreshed once it is older than `datum_cache_ttl` seconds. If
+    USGS cannot be reached, a stale copy is used rather than failing,
+    and USGS is not asked again for `datum_retry_after` seconds.
 
     Inputs
     ----------
     sites : str
-        Comma separated list of site numbers. See `lake_name_to_usgs_site_num`.
+        Comma separated list of site numbers. See `sites.LAKES`.
 
     Returns
     -------
     datum : pandas.DataFrame
         A dataframe of datum elevations. Rows are keyed off lake name,
-        and the main column of interest will be `'alt_va'`.
+        and the main column of interest will be `'alt_va'`. The site
+        number is in `'site_no'`.
     """
-    base_datum_url = 'https://waterservices.usgs.gov/nwis/site/?'
-    datum_url_args = f'&sites={sites}&format=rdb'
-    r = requests.post(base_datum_url + datum_url_args)
-    no_hash = '\n'.join(l for l in r.text.split('\n') if not l.startswith('#'))
+    # Keyed by the URL too, so a stand-in server never pollutes the cache.
+    key = usgs_site_url + sites
+    with _datum_lock:
+        cached = _datum_memory.get(key)
+    if cached is not None:
+        fetched_at, retry_at, datum = cached
+        now = time.time()
+        if now - fetched_at < datum_cache_ttl or now < retry_at:
+            return datum
+
+    path = Path(datum_cache_dir) / (
+        'site-' + hashlib.sha1(key.encode()).hexdigest()[:16] + '.rdb'
+    )
+    try:
+        fetched_at = path.stat().st_mtime
+    except FileNotFoundError:
+        fetched_at = None
+
+    if fetched_at is not None and time.time() - fetched_at < datum_cache_ttl:
+        text = path.read_text()
+        retry_at = 0
+    else:
+        base_datum_url = usgs_site_url + '?'
+        datum_url_args = f'&sites={sites}&format=rdb'
+        try:
+            text = _request('site', base_datum_url + datum_url_args).text
+        except requests.RequestException:
+            if fetched_at is None:
+                raise
+            warnings.warn('Could not reach USGS, using datum elevations'
+                          f' cached at {datetime.fromtimestamp(fetched_at)}.')
+            text = path.read_text()
+            retry_at = time.time() + datum_retry_after
+        else:
+            fetched_at = time.time()
+            retry_at = 0
+            # Write to a temporary file first so that other processes
+            # never see a partially written cache.
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                f.write(text)
+            os.replace(tmp, path)
+
+    datum = _parse_site_rdb(text)
+    with _datum_lock:
+        _datum_memory[key] = (fetched_at, retry_at, datum)
+    return datum
+
+
+def _parse_site_rdb(text: str) -> pd.DataFrame:
+    no_hash = '\n'.join(l for l in text.split('\n') if not l.startswith('#'))
     datum = pd.read_csv(
         io.StringIO(no_hash),
         delimiter='\t'
@@ -129,20 +485,317 @@ def get_datum_elevation(sites: str) -> pd.DataFrame:
     return datum
 
 
-def backfill(start: datetime, end: datetime, lldb: LakeLevelDB, verbose=False):
+class _TokenBucket():
+    def __init__(self, rate: float, capacity: float = 1.0):
+        """
+        Allow on average `rate` acquisitions per second, with bursts of
+        up to `capacity`. Safe to share between threads.
+        """
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self._capacity,
+                    self._tokens + (now - self._last) * self._rate
+                )
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self._rate
+            time.sleep(wait)
+
+
+def _read_checkpoint(checkpoint) -> Union[datetime, None]:
+    try:
+        with open(checkpoint) as f:
+            return datetime.fromisoformat(json.load(f)['done_through'])
+    except FileNotFoundError:
+        return None
+
+
+def _write_checkpoint(checkpoint, done_through: datetime):
+    tmp = f'{checkpoint}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'done_through': done_through.isoformat()}, f)
+    os.replace(tmp, checkpoint)
+
+
+def backfill(start: datetime, end: datetime, lldb: LakeLevelDB,
+             verbose=False, workers=1, rate=10.0, checkpoint=None,
+             batch_days=365, sites=None):
+    """
+    Scrape lake heights from the day of `start` through the day of `end`
+    and insert the raw readings into the database, which also updates the
+    daily maximums. See `LakeLevelDB.insert_readings`.
+
+    The range is split into 30 day windows. Windows are fetched by a pool
+    of `workers` threads, while the calling thread is the only one that
+    writes to the database, in batches of about `batch_days` days.
+
+    Inputs
+    ------
+    start : datetime
+        Starting timestamp to collect data from.
+    end : datetime
+        End timestamp to collect data to. Its day is included.
+    lldb : LakeLevelDB
+        Database to insert into.
+    verbose : bool
+        If truthy, print progress.
+    workers : int
+        Number of windows to fetch concurrently.
+    rate : float
+        Maximum number of windows to request from USGS per second,
+        shared by all workers.
+    checkpoint : str | pathlib.Path | None
+        If given, a file recording how far the backfill has got. Every
+        window before that point has been written to the database. If the
+        file exists when starting, the backfill resumes from there.
+    batch_days : int
+        Approximate number of days to collect before each insert.
+    sites : dict | None
+        USGS site numbers by name of the sites to scrape. If `None`,
+        every site registered in the database, see `LakeLevelDB.sites`.
+    """
+    if sites is None:
+        sites = lldb.sites()
+
+    if checkpoint is not None:
+        done_through = _read_checkpoint(checkpoint)
+        if done_through is not None and done_through > start:
+            if verbose:
+                print(f'Resuming from checkpoint at {done_through}')
+            start = done_through
+
     step = timedelta(days=30)
+    windows = []
+    # A range of a single day is still one window.
+    while start < end or (start == end and not windows):
+        windows.append((start, min(start + step, end), sites))
+        start += step
+
+    def on_written(next_unwritten):
+        if checkpoint is not None:
+            _write_checkpoint(
+                checkpoint,
+                windows[next_unwritten][0]
+                if next_unwritten < len(windows) else end
+            )
+
+    _backfill_windows(windows, lldb, on_written, verbose=verbose,
+                      workers=workers, rate=rate, batch_days=batch_days)
+
+
+def _backfill_windows(windows: list, lldb: LakeLevelDB, on_written=None,
+                      verbose=False, workers=1, rate=10.0, batch_days=365):
+    """
+    Scrape each `(start, end, sites)` window and insert the readings, see
+    `backfill`. After each insert `on_written` is called with the
+    position of the first window not written yet.
+    """
     if verbose:
-        print(f'Starting backfill from {start} to {end}')
-    while start < end:
+        print(f'Starting backfill of {len(windows)} windows'
+              f' using {workers} workers')
+
+    bucket = _TokenBucket(rate)
+
+    def fetch(window):
         # be kind to the servers
-        time.sleep(0.01)
-        df = scrape(start, min(start + step, end))
-        df.index = df.index.tz_convert(pytz.timezone('US/Central'))
-        df = df.resample('1D').max()
-        df.index = df.index.date
-        lldb.insert(df)
-        start += step
-        if verbose:
-            print(f' Scraped starting at {start}')
+        bucket.acquire()
+        start, end, sites = window
+        return scrape(start, end, sites=sites)
+
+    batches = _WindowBatches(windows, lldb, batch_days, on_written, verbose)
+    for results, finished in _fetch_bounded(fetch, windows, workers):
+        for i, df in results.items():
+            batches.add(i, df)
+        batches.write(force=finished)
     if verbose:
         print(' Done.')
+        _print_http_stats()
+
+
+def _fetch_bounded(fetch, items: list, workers: int):
+    """
+    Call `fetch` on each of `items` in a pool of `workers` threads. Each
+    time some finish, yield a dict of their results by position in
+    `items`, and whether every item has finished.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Keep a bounded number of items in flight so results never
+        # pile up in memory faster than they are used.
+        item_iter = iter(enumerate(items))
+        in_flight = {}
+
+        def submit_next():
+            item = next(item_iter, None)
+            if item is not None:
+                in_flight[executor.submit(fetch, item[1])] = item[0]
+
+        for _ in range(2 * workers):
+            submit_next()
+        try:
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                results = {}
+                for future in done:
+                    results[in_flight.pop(future)] = future.result()
+                    submit_next()
+                yield results, not in_flight
+        except BaseException:
+            for future in in_flight:
+                future.cancel()
+            raise
+
+
+class _WindowBatches():
+    def __init__(self, windows: list, lldb: LakeLevelDB, batch_days: int,
+                 on_written=None, verbose=False):
+        """
+        Scraped windows waiting to be inserted, written in batches of
+        about `batch_days` days. See `_backfill_windows`.
+        """
+        self.windows = windows
+        self.lldb = lldb
+        self.batch_days = batch_days
+        self.on_written = on_written
+        self.verbose = verbose
+        self.pending = {}
+        self.written = [False] * len(windows)
+        self.next_unwritten = 0
+        self.t0 = time.monotonic()
+
+    def add(self, i: int, df: pd.DataFrame):
+        self.pending[i] = df
+
+    def write(self, force=False):
+        """
+        Insert the pending windows if they cover at least `batch_days`
+        days, or if `force` is truthy.
+        """
+        # Window ends are inclusive, as they are for `scrape`.
+        pending_days = sum(
+            (self.windows[i][1] - self.windows[i][0]).days + 1
+            for i in self.pending
+        )
+        if not self.pending or (pending_days < self.batch_days
+                                and not force):
+            return
+        self.lldb.insert_readings(pd.concat(self.pending.values()))
+        for i in self.pending:
+            self.written[i] = True
+        self.pending = {}
+        while (self.next_unwritten < len(self.windows)
+               and self.written[self.next_unwritten]):
+            self.next_unwritten += 1
+        if self.on_written is not None:
+            self.on_written(self.next_unwritten)
+        if self.verbose:
+            self._print_progress()
+
+    def _print_progress(self):
+        n_written = sum(self.written)
+        n_windows = len(self.windows)
+        elapsed = time.monotonic() - self.t0
+        eta = elapsed / n_written * (n_windows - n_written)
+        print(f' Written {n_written}/{n_windows} windows,'
+              f' {elapsed:.0f}s elapsed, ~{eta:.0f}s left')
+
+
+def _print_http_stats():
+    for endpoint, stats in http_stats().items():
+        print(f' USGS {endpoint}: {stats["requests"]} requests,'
+              f' {stats["retries"]} retried,'
+              f' {stats["latency_total"] / stats["requests"]:.2f}s'
+              f' mean latency, {stats["latency_max"]:.2f}s max')
+
+
+def gap_windows(gaps: pd.DataFrame, sites: dict, max_days=30) -> list:
+    """
+    Cover the days of `gaps` with as few windows to scrape as possible.
+
+    Days are taken in order, and each window is grown until the next day
+    is `max_days` or more after its first day. A window only asks for the
+    sites that have a gap in it.
+
+    Inputs
+    ------
+    gaps : pd.DataFrame
+        Days with gaps, as returned by `LakeLevelDB.gaps`.
+    sites : dict
+        USGS site numbers by name of the sites in `gaps`.
+    max_days : int
+        Most days to request in one window.
+
+    Returns
+    -------
+    windows : list of (datetime, datetime, dict)
+        The first and last day of each window, both inclusive, and the
+        sites to scrape in it.
+    """
+    windows = []
+    days = gaps.index
+    missing = gaps[list(sites)].values
+    first = 0
+    for i in range(1, len(days) + 1):
+        if i < len(days) and (days[i] - days[first]).days < max_days:
+            continue
+        in_window = missing[first:i].any(axis=0)
+        windows.append((
+            days[first].to_pydatetime(), days[i - 1].to_pydatetime(),
+            {name: site for (name, site), gap in zip(sites.items(), in_window)
+             if gap}
+        ))
+        first = i
+    return windows
+
+
+def backfill_gaps(lldb: LakeLevelDB, start=None, end=None, sites=None,
+                  max_days=30, verbose=False, workers=1, rate=10.0,
+                  batch_days=365) -> list:
+    """
+    Scrape only the days the database has gaps on, see
+    `LakeLevelDB.gaps`, rather than the whole range as `backfill` does.
+    Gap days are grouped into as few windows as possible by
+    `gap_windows`, and each window asks USGS for just the sites missing
+    in it. Days USGS has no readings for stay gaps, and are asked for
+    again by the next run.
+
+    Inputs
+    ------
+    lldb : LakeLevelDB
+        Database to check and insert into.
+    start : datetime | None
+        First day to check, see `LakeLevelDB.gaps`.
+    end : datetime | None
+        Last day to check, see `LakeLevelDB.gaps`.
+    sites : list of str | None
+        Names of the sites to check. If `None`, every registered site.
+    max_days : int
+        Most days to request in one window.
+    verbose, workers, rate, batch_days :
+        See `backfill`.
+
+    Returns
+    -------
+    windows : list of (datetime, datetime, dict)
+        The windows that were scraped, see `gap_windows`.
+    """
+    gaps = lldb.gaps(start=start, end=end, sites=sites)
+    registered = lldb.sites()
+    site_ids = {name: registered[name] for name in gaps.columns[1:]}
+    windows = gap_windows(gaps, site_ids, max_days=max_days)
+    if verbose:
+        print(f'Found {len(gaps)} days with gaps')
+    if windows:
+        _backfill_windows(windows, lldb, verbose=verbose, workers=workers,
+                          rate=rate, batch_days=batch_days)
+    return windows
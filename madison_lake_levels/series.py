@@ -0,0 +1,286 @@
+import base64
+
+import numpy as np
+import pandas as pd
+
+# Bokeh draws datetimes as milliseconds since 1970-01-01.
+_MS_PER_DAY = 24 * 60 * 60 * 1000
+
+# Encodings of `LakeSeries.to_payload`.
+PAYLOAD_FORMATS = ['json', 'base64']
+
+
+def day_number(date) -> int:
+    """
+    Return the day of `date` as days since 1970-01-01. Any time of day is
+    dropped.
+    """
+    day = np.datetime64(pd.Timestamp(date).date(), 'D')
+    return int(day.astype(np.int64))
+
+
+def day_numbers(dates) -> np.ndarray:
+    """
+    Return each of `dates` as int32 days since 1970-01-01.
+    """
+    days = pd.DatetimeIndex(dates).values.astype('datetime64[D]')
+    return days.astype(np.int64).astype(np.int32)
+
+
+def as_float64(values: np.ndarray) -> np.ndarray:
+    """
+    Widen float32 heights to the float64 with the shortest decimal that
+    rounds to the same float32, e.g. 850.26 rather than
+    850.260009765625. This is the value the databases return for a
+    `real`, so frames built from a LakeSeries match the ones read from
+    SQL exactly.
+
+    Values are rounded to 0, 1, 2, ... decimal places in turn, and each
+    keeps the first rounding that gives back the same float32. Lake
+    heights need about five passes. Values outside the range where this
+    is exact fall back to formatting as text.
+    """
+    values = np.asarray(values, dtype=np.float32)
+    wide = values.astype(np.float64)
+    out = np.full(wide.shape, np.nan)
+    with np.errstate(invalid='ignore'):
+        todo = (np.abs(wide) >= 1e-3) & (np.abs(wide) < 1e7)
+    for decimals in range(10):
+        if not todo.any():
+            break
+        rounded = np.round(wide, decimals)
+        done = todo & (rounded.astype(np.float32) == values)
+        np.copyto(out, rounded, where=done)
+        todo &= ~done
+    rest = np.isnan(out) & ~np.isnan(wide)
+    out[rest] = values[rest].astype(str).astype(np.float64)
+    return out
+
+
+class LakeSeries():
+    def __init__(self, days: np.ndarray, values: np.ndarray, lakes):
+        """
+        Daily lake levels held in flat NumPy arrays: an int32 day number
+        per date (days since 1970-01-01) and a contiguous float32 array of
+        heights per lake, half the size of the float64 DataFrame they
+        stand in for.
+
+        A LakeSeries is read-only, and slicing one returns views of the
+        same arrays, so a single instance can be shared by every thread
+        and request without copying. The arrays passed in are used as
+        they are when they already have the right dtype, and are marked
+        read-only.
+
+        Inputs
+        ------
+        days : np.ndarray
+            Strictly increasing days since 1970-01-01, see `day_numbers`.
+        values : np.ndarray
+            Heights of shape (len(lakes), len(days)). Missing values
+            are NaN.
+        lakes : list of str
+            The lakes, in the order of the first axis of `values`.
+        """
+        self.lakes = list(lakes)
+        self.days = np.asarray(days, dtype=np.int32)
+        self.values = np.asarray(values, dtype=np.float32).reshape(
+            len(self.lakes), self.days.size
+        )
+        self.days.flags.writeable = False
+        self.values.flags.writeable = False
+        # Row of each day from days[0] to days[-1], -1 where there is
+        # none, built the first time a single date is looked up.
+        self._rows = None
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'LakeSeries':
+        """
+        Build a LakeSeries from a DataFrame with a sorted DatetimeIndex
+        and a column per lake, as returned by `LakeLevelDB.to_df`.
+        """
+        values = np.ascontiguousarray(df.values.T, dtype=np.float32)
+        return cls(day_numbers(df.index), values, df.columns)
+
+    @classmethod
+    def empty(cls, lakes) -> 'LakeSeries':
+        """
+        Return a LakeSeries of `lakes` with no dates.
+        """
+        return cls(np.empty(0, dtype=np.int32),
+                   np.empty((len(lakes), 0), dtype=np.float32), lakes)
+
+    def __len__(self) -> int:
+        return self.days.size
+
+    def __getitem__(self, rows) -> 'LakeSeries':
+        """
+        Return a view of a range of rows, e.g. `series[-1:]`, or a copy
+        of the rows at an array of positions.
+        """
+        return LakeSeries(self.days[rows], self.values[:, rows], self.lakes)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Bytes held by the arrays of the series.
+        """
+        rows = 0 if self._rows is None else self._rows.nbytes
+        return self.days.nbytes + self.values.nbytes + rows
+
+    def lake(self, lake: str) -> np.ndarray:
+        """
+        Return a view of the heights of `lake`.
+        """
+        return self.values[self.lakes.index(lake)]
+
+    def select(self, lakes) -> 'LakeSeries':
+        """
+        Return a LakeSeries of only `lakes`, in that order. This is a
+        view when `lakes` are all the lakes, in order.
+        """
+        lakes = list(lakes)
+        if lakes == self.lakes:
+            return self
+        rows = [self.lakes.index(lake) for lake in lakes]
+        return LakeSeries(self.days, self.values[rows], lakes)
+
+    def row(self, date) -> int:
+        """
+        Return the position of `date`, or -1 if it has no row. This takes
+        constant time, using a table from day number to row.
+        """
+        if self._rows is None:
+            rows = np.full(
+                self.days[-1] - self.days[0] + 1 if self.days.size else 0, -1,
+                dtype=np.int32
+            )
+            rows[self.days - self.days[:1]] = np.arange(
+                self.days.size, dtype=np.int32
+            )
+            self._rows = rows
+        day = day_number(date) - (int(self.days[0]) if self.days.size else 0)
+        if 0 <= day < self._rows.size:
+            return int(self._rows[day])
+        return -1
+
+    def at(self, date) -> dict:
+        """
+        Return the height of each lake on `date`, None where it is missing
+        or the date has no row.
+        """
+        row = self.row(date)
+        if row < 0:
+            return {lake: None for lake in self.lakes}
+        heights = as_float64(self.values[:, row]).tolist()
+        return {lake: None if np.isnan(height) else height
+                for lake, height in zip(self.lakes, heights)}
+
+    def between(self, start=None, end=None) -> 'LakeSeries':
+        """
+        Return a view of the dates from `start` to `end`, inclusive.
+        Either can be None to leave that end open.
+        """
+        lo, hi = 0, self.days.size
+        if start is not None:
+            lo = self.days.searchsorted(day_number(start), side='left')
+        if end is not None:
+            hi = self.days.searchsorted(day_number(end), side='right')
+        return self[lo:hi]
+
+    def latest(self) -> 'LakeSeries':
+        """
+        Return the last non-missing height of each lake. Rows are the
+        dates of those heights, and every other value is NaN.
+        """
+        valid = ~np.isnan(self.values)
+        last = np.full(len(self.lakes), -1)
+        if self.days.size:
+            last = np.where(valid.any(axis=1),
+                            self.days.size - 1 - valid[:, ::-1].argmax(axis=1),
+                            -1)
+        rows = np.unique(last[last >= 0])
+        values = np.full((len(self.lakes), rows.size), np.nan,
+                         dtype=np.float32)
+        for i, row in enumerate(last):
+            if row >= 0:
+                values[i, rows.searchsorted(row)] = self.values[i, row]
+        return LakeSeries(self.days[rows], values, self.lakes)
+
+    def merge(self, other: 'LakeSeries') -> 'LakeSeries':
+        """
+        Return a new LakeSeries with the rows of `other` added, replacing
+        any rows of the same dates. Both must have the same lakes.
+        """
+        if other.lakes != self.lakes:
+            raise ValueError('Cannot merge series of different lakes.')
+        if not other.days.size:
+            return self
+        if not self.days.size or self.days[-1] < other.days[0]:
+            # New days at the end, the usual case for a daily scrape.
+            days = np.concatenate([self.days, other.days])
+            values = np.concatenate([self.values, other.values], axis=1)
+            return LakeSeries(days, values, self.lakes)
+        keep = ~np.isin(self.days, other.days)
+        days = np.concatenate([self.days[keep], other.days])
+        order = np.argsort(days, kind='stable')
+        values = np.concatenate([self.values[:, keep], other.values], axis=1)
+        return LakeSeries(days[order], values[:, order], self.lakes)
+
+    def dates(self) -> pd.DatetimeIndex:
+        """
+        Return the dates as a DatetimeIndex.
+        """
+        return pd.DatetimeIndex(self.days.astype('datetime64[D]'),
+                                name='datetime')
+
+    def epoch_ms(self) -> np.ndarray:
+        """
+        Return the dates as milliseconds since 1970-01-01, the unit Bokeh
+        uses for datetime axes.
+        """
+        return self.days.astype(np.int64) * _MS_PER_DAY
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Return the series as a DataFrame with a DatetimeIndex and a float64
+        column per lake, as returned by `LakeLevelDB.to_df`.
+        """
+        return pd.DataFrame(as_float64(self.values.T), index=self.dates(),
+                            columns=self.lakes)
+
+    def to_payload(self, fmt='json') -> dict:
+        """
+        Return the series as a dict that can be sent as JSON, with the
+        days since 1970-01-01 under `day` and the heights of each lake
+        under its name.
+
+        Inputs
+        ------
+        fmt : str
+            'json' sends numbers, heights as their shortest decimals and
+            null where missing. 'base64' sends each array as a dict of the
+            base64 encoded little-endian bytes under `__ndarray__`, its
+            `dtype` (int32 or float32) and `shape`, the layout Bokeh
+            embeds arrays in, NaN where missing.
+        """
+        if fmt not in PAYLOAD_FORMATS:
+            raise ValueError(f'format must be one of {PAYLOAD_FORMATS}.')
+        if fmt == 'base64':
+            payload = {'day': _encode_array(self.days, '<i4')}
+            payload.update({lake: _encode_array(heights, '<f4')
+                            for lake, heights in zip(self.lakes, self.values)})
+            return payload
+        payload = {'day': self.days.tolist()}
+        for lake, heights in zip(self.lakes, as_float64(self.values)):
+            payload[lake] = [None if height != height else height
+                             for height in heights.tolist()]
+        return payload
+
+
+def _encode_array(values: np.ndarray, dtype: str) -> dict:
+    values = np.ascontiguousarray(values, dtype=dtype)
+    return {
+        '__ndarray__': base64.b64encode(values.tobytes()).decode('ascii'),
+        'dtype': values.dtype.name,
+        'shape': list(values.shape),
+    }
@@ -0,0 +1,11 @@
+# USGS gauges on the four Madison lakes, by the name used for their columns
+# throughout the package. These are the lakes shown on the web pages, and
+# are registered in every database. Other gauges are added to a database's
+# site registry with `LakeLevelDB.add_sites`.
+# See https://waterdata.usgs.gov/wi/nwis/current/?type=dane&group_key=NONE
+LAKES = {
+    'mendota': '05428000',
+    'monona': '05429000',
+    'waubesa': '05429485',
+    'kegonsa': '425715089164700',
+}
@@ -0,0 +1,644 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import sqlite3
+import threading
+from typing import Iterator, Union
+
+import numpy as np
+import pandas as pd
+
+from . import metrics
+from .db import LakeLevelDB, SUMMER_MONTHS, _csv_height, _year_ranges
+from .sites import LAKES
+
+# Readings are compared as text, so every timestamp is written this way.
+_TS_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+def _real(values) -> list:
+    """
+    Round heights to single precision, as the real columns of the
+    Postgres schema do, and turn NaN into None.
+    """
+    # Shortest representation of the float32 value, which is also what
+    # psycopg2 hands back for a real.
+    text = np.asarray(values, dtype='float32').astype(str)
+    return [None if height == 'nan' else float(height) for height in text]
+
+
+def _literal(text) -> str:
+    return "'" + str(text).replace("'", "''") + "'"
+
+
+def _identifier(name) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+class SQLiteLakeLevelDB(LakeLevelDB):
+    backend = 'sqlite'
+
+    def __init__(self, path, pool_size=None, pool_timeout=30.0):
+        """
+        Open a lake level database stored in the SQLite file `path`,
+        which is created by the first operation if needed. It has the same
+        interface and semantics as LakeLevelDB, but runs in-process, so no
+        database server is needed and reads make no network round trip.
+
+        Each thread uses its own connection. The file is kept in
+        write-ahead log mode so readers never wait for writers. Writers
+        take turns, waiting up to `pool_timeout` seconds for each other.
+        `pool_size` is accepted for compatibility and ignored.
+        """
+        self._path = str(path)
+        self._timeout = pool_timeout
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._init_state()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit mode, transactions are begun explicitly.
+            conn = sqlite3.connect(self._path, timeout=self._timeout,
+                                   isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode = WAL')
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def _begin(self, name=None, write=False):
+        """
+        Yield a cursor on this thread's connection. The transaction is
+        committed if the block succeeds and rolled back otherwise. With
+        `write` the database's write lock is taken up front, so writers
+        take turns like with the table locks of LakeLevelDB. `name` is
+        ignored.
+        """
+        conn = self._connection()
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE' if write else 'BEGIN')
+        try:
+            yield cursor
+        except BaseException:
+            if conn.in_transaction:
+                cursor.execute('ROLLBACK')
+            raise
+        else:
+            cursor.execute('COMMIT')
+        finally:
+            cursor.close()
+
+    def pool_stats(self) -> dict:
+        """
+        Return the number of open connections, one per thread that used
+        the database.
+        """
+        with self._connections_lock:
+            return {'backend': self.backend,
+                    'connections': len(self._connections)}
+
+    def close(self):
+        """
+        Close the connections of all threads.
+        """
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+    def _create_if_nonexistent(self):
+        with self._begin(write=True) as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master"
+                " WHERE type = 'table' AND name = 'season_stats'"
+            )
+            new_stats = cursor.fetchone() is None
+            cursor.execute(
+                "SELECT type FROM sqlite_master WHERE name = 'levels'"
+            )
+            row = cursor.fetchone()
+            levels_type = None if row is None else row[0]
+            # See `LakeLevelDB._create_if_nonexistent`.
+            cursor.execute(
+                'CREATE TABLE IF NOT EXISTS sites ('
+                ' site_id TEXT PRIMARY KEY,'
+                ' name TEXT NOT NULL UNIQUE)'
+            )
+            cursor.execute(
+                'CREATE TABLE IF NOT EXISTS site_levels ('
+                ' site_id TEXT NOT NULL,'
+                ' date TEXT NOT NULL,'
+                ' value REAL,'
+                ' version INTEGER NOT NULL,'
+                ' modified TEXT NOT NULL,'
+                ' PRIMARY KEY (site_id, date)) WITHOUT ROWID'
+            )
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS site_levels_version_idx'
+                ' ON site_levels (version)'
+            )
+            cursor.executemany(
+                'INSERT OR IGNORE INTO sites (site_id, name) VALUES (?, ?)',
+                [(site_id, name) for name, site_id in LAKES.items()]
+            )
+            if levels_type == 'table':
+                # The table of older versions, with a column per lake.
+                cursor.execute(
+                    'INSERT INTO site_levels'
+                    ' (site_id, date, value, version, modified) '
+                    + ' UNION ALL '.join(
+                        f'SELECT {_literal(site_id)}, datetime, {name},'
+                        ' version, modified FROM levels'
+                        for name, site_id in LAKES.items()
+                    )
+                )
+                cursor.execute('DROP TABLE levels')
+            if levels_type != 'view':
+                cursor.execute('CREATE VIEW levels AS ' + self._pivot(
+                    LAKES, extra=['max(version) AS version',
+                                  'max(modified) AS modified']
+                ))
+            cursor.execute('PRAGMA table_info(readings)')
+            legacy_readings = 'lake' in {row[1] for row in cursor.fetchall()}
+            if legacy_readings:
+                # Readings of older versions named their site. A primary
+                # key cannot be altered, so the table is rebuilt.
+                cursor.execute(
+                    'ALTER TABLE readings RENAME TO readings_by_lake'
+                )
+                cursor.execute('DROP INDEX IF EXISTS readings_ts_idx')
+            cursor.execute(
+                'CREATE TABLE IF NOT EXISTS readings ('
+                ' site_id TEXT NOT NULL,'
+                ' ts TEXT NOT NULL,'
+                ' height REAL NOT NULL,'
+                ' PRIMARY KEY (site_id, ts)) WITHOUT ROWID'
+            )
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS readings_ts_idx ON readings (ts)'
+            )
+            if legacy_readings:
+                cursor.execute(
+                    'INSERT INTO readings (site_id, ts, height)'
+                    ' SELECT sites.site_id, r.ts, r.height'
+                    ' FROM readings_by_lake AS r'
+                    ' JOIN sites ON sites.name = r.lake'
+                )
+                cursor.execute('DROP TABLE readings_by_lake')
+            cursor.execute(
+                'CREATE TABLE IF NOT EXISTS season_stats ('
+                ' year INTEGER NOT NULL,'
+                ' season TEXT NOT NULL,'
+                ' lake TEXT NOT NULL,'
+                ' days INTEGER NOT NULL,'
+                ' over_max INTEGER NOT NULL,'
+                ' under_min INTEGER NOT NULL,'
+                ' PRIMARY KEY (year, season, lake))'
+            )
+            if new_stats:
+                self._refresh_season_stats(cursor)
+
+    @staticmethod
+    def _pivot(sites: dict, conditions=(), extra=()) -> str:
+        """
+        Return a SELECT of the values of `sites` with one row per date and
+        a column per site, see `LakeLevelDB._pivot`.
+        """
+        columns = ', '.join(
+            f'max(CASE WHEN site_id = {_literal(site_id)} THEN value END)'
+            f' AS {_identifier(name)}'
+            for name, site_id in sites.items()
+        )
+        site_ids = ', '.join(map(_literal, sites.values()))
+        return (
+            f'SELECT date AS datetime, {columns}'
+            + ''.join(f', {agg}' for agg in extra)
+            + f' FROM site_levels WHERE site_id IN ({site_ids})'
+            + ''.join(f' AND {condition}' for condition in conditions)
+            + ' GROUP BY date'
+        )
+
+    def add_sites(self, sites: dict):
+        """
+        Register USGS gauges, see `LakeLevelDB.add_sites`.
+        """
+        with self._transaction(write=True) as cursor:
+            cursor.executemany(
+                'INSERT OR IGNORE INTO sites (site_id, name) VALUES (?, ?)',
+                [(str(site_id), name) for name, site_id in sites.items()]
+            )
+        self._check_sites(sites)
+
+    @staticmethod
+    def _insert_cmd(replace: bool) -> str:
+        cmd = ('INSERT INTO site_levels (site_id, date, value, version,'
+               ' modified) VALUES (?, ?, ?, ?, ?)')
+        if not replace:
+            return cmd
+        # max() of anything and NULL is NULL, so fall back to whichever
+        # value exists and a missing value never overwrites an existing
+        # one. Rows whose value would not change keep their version.
+        greatest = ('coalesce(max(site_levels.value, excluded.value),'
+                    ' site_levels.value, excluded.value)')
+        return cmd + (
+            f' ON CONFLICT (site_id, date) DO UPDATE SET value = {greatest},'
+            ' version = excluded.version, modified = excluded.modified'
+            f' WHERE site_levels.value IS NOT {greatest}'
+        )
+
+    @staticmethod
+    def _next_version(cursor) -> int:
+        # Writers take turns, so this is never handed out twice.
+        cursor.execute(
+            'SELECT coalesce(max(version), 0) + 1 FROM site_levels'
+        )
+        return cursor.fetchone()[0]
+
+    @staticmethod
+    def _level_rows(keys, values, version) -> list:
+        """
+        Return rows of site_levels for `keys`, a list of (site number,
+        date) pairs, and their `values`.
+        """
+        modified = datetime.now(timezone.utc).isoformat()
+        return [
+            (site_id, date, height, version, modified)
+            for (site_id, date), height in zip(keys, _real(values))
+        ]
+
+    def _write_levels(self, cursor, keys, values):
+        """
+        Merge daily values into site_levels with the keep-the-max rule,
+        stamp the rows that changed with a new version and recount their
+        years in season_stats.
+        """
+        version = self._next_version(cursor)
+        cursor.executemany(self._insert_cmd(True),
+                           self._level_rows(keys, values, version))
+        cursor.execute(
+            'SELECT DISTINCT CAST(substr(date, 1, 4) AS INTEGER)'
+            ' FROM site_levels WHERE version = ?', (version,)
+        )
+        self._refresh_season_stats(cursor, {year for year, in cursor})
+
+    @metrics.timed('db.insert')
+    def insert(self, df: pd.DataFrame, replace=True):
+        """
+        Insert a dataframe of data into the database, see
+        `LakeLevelDB.insert`. Inserting a date that already exists with
+        `replace` falsy raises sqlite3.IntegrityError.
+        """
+        site_ids = self._site_ids(df.columns)
+        if replace:
+            df = df.groupby(level=0).max()
+        dates = pd.to_datetime(df.index).strftime('%Y-%m-%d')
+        keys = [(site_id, date) for site_id in site_ids.values()
+                for date in dates]
+        values = df[list(site_ids)].values.T.reshape(-1)
+        with self._transaction(write=True) as cursor:
+            if replace:
+                self._write_levels(cursor, keys, values)
+            else:
+                version = self._next_version(cursor)
+                cursor.executemany(self._insert_cmd(False),
+                                   self._level_rows(keys, values, version))
+                self._refresh_season_stats(
+                    cursor, {int(date[:4]) for date in dates}
+                )
+        self._bump_data_version()
+
+    @metrics.timed('db.insert_readings')
+    def insert_readings(self, df: pd.DataFrame):
+        """
+        Insert raw (sub-daily) gage readings and fold them into the daily
+        levels, see `LakeLevelDB.insert_readings`. Only readings that are
+        new or changed are rolled up, in SQL.
+        """
+        long = self._readings_long(df)
+        rows = list(zip(
+            long['site_id'],
+            long['ts'].dt.strftime(_TS_FORMAT),
+            long['ts'].dt.tz_convert('US/Central').dt.strftime('%Y-%m-%d'),
+            _real(long['height'].values),
+        ))
+        with self._transaction(write=True) as cursor:
+            cursor.execute('CREATE TEMPORARY TABLE readings_stage'
+                           ' (site_id TEXT, ts TEXT, day TEXT, height REAL)')
+            cursor.executemany(
+                'INSERT INTO readings_stage VALUES (?, ?, ?, ?)', rows
+            )
+            # The highest of duplicate readings, if it differs from the
+            # stored one.
+            cursor.execute(
+                'CREATE TEMPORARY TABLE readings_new AS'
+                ' SELECT s.site_id, s.ts, s.day, max(s.height) AS height'
+                ' FROM readings_stage AS s LEFT JOIN readings AS r'
+                '  ON r.site_id = s.site_id AND r.ts = s.ts'
+                ' GROUP BY s.site_id, s.ts, s.day'
+                ' HAVING max(s.height) IS NOT max(r.height)'
+            )
+            # The WHERE disambiguates the upsert from a join for the parser.
+            cursor.execute(
+                'INSERT INTO readings (site_id, ts, height)'
+                ' SELECT site_id, ts, height FROM readings_new WHERE true'
+                ' ON CONFLICT (site_id, ts) DO UPDATE'
+                ' SET height = excluded.height'
+            )
+            cursor.execute(
+                'SELECT site_id, day, max(height) FROM readings_new'
+                ' GROUP BY site_id, day'
+            )
+            daily = cursor.fetchall()
+            if daily:
+                self._write_levels(
+                    cursor, [row[:2] for row in daily],
+                    [row[2] for row in daily]
+                )
+            cursor.execute('DROP TABLE temp.readings_stage')
+            cursor.execute('DROP TABLE temp.readings_new')
+        self._bump_data_version()
+
+    @metrics.timed('db.readings')
+    def readings(self, start=None, end=None, lakes=None) -> pd.DataFrame:
+        """
+        Return raw gage readings with a UTC DatetimeIndex and a column per
+        lake, see `LakeLevelDB.readings`.
+        """
+        site_ids = self._site_ids(self._columns[1:] if lakes is None
+                                  else lakes)
+        conditions = [f'site_id IN ({", ".join("?" * len(site_ids))})']
+        params = list(site_ids.values())
+        for value, op in [(start, '>='), (end, '<=')]:
+            if value is not None:
+                conditions.append(f'ts {op} ?')
+                ts = pd.Timestamp(value)
+                if ts.tzinfo is None:
+                    ts = ts.tz_localize('UTC')
+                params.append(ts.tz_convert('UTC').strftime(_TS_FORMAT))
+        with self._transaction() as cursor:
+            cursor.execute('SELECT site_id, ts, height FROM readings WHERE '
+                           + ' AND '.join(conditions), params)
+            rows = cursor.fetchall()
+        return self._readings_frame(rows, site_ids)
+
+    def _refresh_season_stats(self, cursor, years=None):
+        """
+        Recount the season_stats buckets of the given years from levels,
+        or of every year if `years` is `None`, see
+        `LakeLevelDB._refresh_season_stats`.
+        """
+        if years is not None and not years:
+            return
+        from .required_levels import required_levels
+
+        lakes = self._columns[1:]
+        year = 'CAST(substr(datetime, 1, 4) AS INTEGER)'
+        # Only the rows of `years` are read, by date ranges that the
+        # (site_id, date) key can find.
+        conditions = []
+        if years is not None:
+            conditions.append('(' + ' OR '.join(
+                f'(date >= {_literal(first)} AND date < {_literal(after)})'
+                for first, after in _year_ranges(years)
+            ) + ')')
+        # One pass over the levels, pivoted as in the levels view and
+        # unpivoted again by joining each date with every lake, see
+        # `LakeLevelDB._refresh_season_stats`.
+        height = 'CASE required.lake ' + ' '.join(
+            f'WHEN {_literal(lake)} THEN levels.{lake}' for lake in lakes
+        ) + ' END'
+        params = []
+        for lake in lakes:
+            params += [lake] + [
+                float(required_levels.loc[lake, column])
+                for column in ['summer_maximum', 'summer_minimum',
+                               'winter_minimum']
+            ]
+        if years is not None:
+            years = sorted(years)
+            marks = ', '.join('?' * len(years))
+            cursor.execute(f'DELETE FROM season_stats WHERE year IN ({marks})',
+                           years)
+        else:
+            cursor.execute('DELETE FROM season_stats')
+        cursor.execute(
+            'WITH required'
+            ' (lake, summer_maximum, summer_minimum, winter_minimum)'
+            f' AS (VALUES {", ".join(["(?, ?, ?, ?)"] * len(lakes))})'
+            ' INSERT INTO season_stats'
+            ' SELECT year, season, lake, count(*),'
+            '  count(CASE WHEN height > summer_maximum THEN 1 END),'
+            "  count(CASE WHEN height < CASE season"
+            "   WHEN 'summer' THEN summer_minimum ELSE winter_minimum END"
+            '   THEN 1 END)'
+            ' FROM ('
+            f'  SELECT {year} AS year,'
+            '   CASE WHEN CAST(substr(datetime, 6, 2) AS INTEGER)'
+            f'    BETWEEN {SUMMER_MONTHS[0]} AND {SUMMER_MONTHS[-1]}'
+            "    THEN 'summer' ELSE 'winter' END AS season,"
+            f'   required.*, {height} AS height'
+            f'  FROM ({self._pivot(LAKES, conditions)}) AS levels'
+            '  CROSS JOIN required'
+            ' ) AS days'
+            ' GROUP BY year, season, lake', params
+        )
+
+    @metrics.timed('db.season_stats')
+    def season_stats(self, start_year=None, end_year=None) -> pd.DataFrame:
+        """
+        Return how often each lake was outside its required levels, see
+        `LakeLevelDB.season_stats`.
+        """
+        conditions = []
+        params = []
+        if start_year is not None:
+            conditions.append('year >= ?')
+            params.append(int(start_year))
+        if end_year is not None:
+            conditions.append('year <= ?')
+            params.append(int(end_year))
+        where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+        with self._transaction() as cursor:
+            cursor.execute(
+                'SELECT lake, season, sum(days), sum(over_max), sum(under_min)'
+                f' FROM season_stats{where} GROUP BY lake, season', params
+            )
+            rows = cursor.fetchall()
+        return self._season_stats_frame(rows)
+
+    @metrics.timed('db.last_modified')
+    def last_modified(self) -> Union[datetime, None]:
+        """
+        Return when the table was last written to as a naive UTC datetime,
+        or `None` if it is empty.
+        """
+        with self._transaction() as cursor:
+            cursor.execute(
+                'SELECT modified FROM site_levels'
+                ' ORDER BY version DESC LIMIT 1'
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        return datetime.fromisoformat(row[0]).replace(tzinfo=None)
+
+    @metrics.timed('db.date_range')
+    def date_range(self, start=None, end=None) -> tuple:
+        """
+        Return the first and last dates from `start` to `end` that the
+        lakes have rows on, see `LakeLevelDB.date_range`.
+        """
+        site_ids = ', '.join(map(_literal, LAKES.values()))
+        params = [
+            None if value is None else pd.to_datetime(value).date().isoformat()
+            for value in [start, end]
+        ]
+        with self._transaction() as cursor:
+            cursor.execute(
+                'SELECT min(date), max(date) FROM site_levels'
+                f' WHERE site_id IN ({site_ids})'
+                "  AND date BETWEEN coalesce(?, '') AND coalesce(?, '9999')",
+                params
+            )
+            first, last = cursor.fetchone()
+        return pd.Timestamp(first), pd.Timestamp(last)
+
+    @metrics.timed('db.changed_since')
+    def changed_since(self, version: int) -> pd.DatetimeIndex:
+        """
+        Return the dates of values written after `data_version` returned
+        `version`.
+        """
+        with self._transaction() as cursor:
+            cursor.execute(
+                'SELECT DISTINCT date FROM site_levels WHERE version > ?'
+                ' ORDER BY date', (version,)
+            )
+            rows = cursor.fetchall()
+        return pd.DatetimeIndex([row[0] for row in rows], name='datetime')
+
+    def _rows_since(self, version: int) -> list:
+        site_ids = ', '.join(map(_literal, LAKES.values()))
+        cmd = self._pivot(LAKES, conditions=[
+            'date IN (SELECT date FROM site_levels'
+            f' WHERE version > ? AND site_id IN ({site_ids}))'
+        ], extra=['max(version)'])
+        with self._transaction() as cursor:
+            cursor.execute(cmd, (version,))
+            return cursor.fetchall()
+
+    @metrics.timed('db.site_levels')
+    def site_levels(self, sites=None, start=None, end=None) -> pd.DataFrame:
+        """
+        Return daily levels of any registered sites, pivoted in SQL to a
+        column per site, see `LakeLevelDB.site_levels`.
+        """
+        site_ids = self.sites() if sites is None else self._site_ids(sites)
+        conditions = []
+        params = []
+        for value, op in [(start, '>='), (end, '<=')]:
+            if value is not None:
+                conditions.append(f'date {op} ?')
+                params.append(pd.to_datetime(value).strftime('%Y-%m-%d'))
+        with self._transaction() as cursor:
+            cursor.execute(self._pivot(site_ids, conditions)
+                           + ' ORDER BY datetime', params)
+            rows = cursor.fetchall()
+        df = pd.DataFrame.from_records(
+            rows, columns=['datetime'] + list(site_ids)
+        ).set_index('datetime').astype(float)
+        df.index = pd.to_datetime(df.index)
+        return df
+
+    @metrics.timed('db.gaps')
+    def gaps(self, start=None, end=None, sites=None) -> pd.DataFrame:
+        """
+        Return the days on which some of the sites have no level, see
+        `LakeLevelDB.gaps`. The days are generated with a recursive query.
+        """
+        site_ids = self.sites() if sites is None else self._site_ids(sites)
+        ids = ', '.join(map(_literal, site_ids.values()))
+        start, end = (
+            None if value is None
+            else pd.to_datetime(value).strftime('%Y-%m-%d')
+            for value in [start, end]
+        )
+        cmd = (
+            'WITH RECURSIVE bounds AS ('
+            " SELECT site_id, max(min(date), coalesce(?, '')) AS first"
+            f' FROM site_levels WHERE site_id IN ({ids}) GROUP BY site_id'
+            '), last(date) AS ('
+            ' SELECT coalesce(?, (SELECT max(date) FROM site_levels'
+            f'  WHERE site_id IN ({ids})))'
+            '), days(date) AS ('
+            ' SELECT min(first) FROM bounds'
+            ' UNION ALL'
+            " SELECT date(days.date, '+1 day') FROM days, last"
+            ' WHERE days.date < last.date'
+            '), expected AS ('
+            ' SELECT bounds.site_id, days.date'
+            ' FROM bounds JOIN days ON days.date >= bounds.first'
+            ')'
+            ' SELECT expected.date, count(site_levels.date),'
+            '  count(site_levels.value),'
+            '  group_concat(CASE WHEN site_levels.value IS NULL'
+            "   THEN expected.site_id END, ',')"
+            ' FROM expected LEFT JOIN site_levels'
+            '  ON site_levels.site_id = expected.site_id'
+            '  AND site_levels.date = expected.date'
+            ' GROUP BY expected.date'
+            ' HAVING count(site_levels.value) < count(*)'
+            ' ORDER BY expected.date'
+        )
+        with self._transaction() as cursor:
+            cursor.execute(cmd, (start, end))
+            rows = cursor.fetchall()
+        return self._gap_frame(rows, site_ids)
+
+    @metrics.timed('db.query')
+    def query(self, start=None, end=None, lakes=None,
+              latest_only=False) -> pd.DataFrame:
+        """
+        Return lake levels, see `LakeLevelDB.query`. The filtering is done
+        on the in-memory copy of the table kept by `series`, after bringing
+        it up to date.
+        """
+        lakes, _, _ = self._range_filter(start, end, lakes)
+        series = self.series().between(start, end).select(lakes)
+        if latest_only:
+            series = series.latest()
+        return series.to_frame()
+
+    def iter_csv(self, start=None, end=None, lakes=None,
+                 rows_per_chunk=5000) -> Iterator[str]:
+        """
+        Return an iterator over the table as CSV text, a chunk at a time,
+        see `LakeLevelDB.iter_csv`. The rows come from `query`.
+        """
+        df = self.query(start=start, end=end, lakes=lakes)
+        return self._iter_frame_csv(df, rows_per_chunk)
+
+    @staticmethod
+    def _iter_frame_csv(df, rows_per_chunk):
+        yield ','.join(['datetime'] + df.columns.tolist()) + '\n'
+        dates = df.index.strftime('%Y-%m-%d')
+        values = df.values.tolist()
+        for i in range(0, len(values), rows_per_chunk):
+            yield ''.join(
+                ','.join([date] + [_csv_height(height) for height in heights])
+                + '\n'
+                for date, heights in zip(dates[i:i + rows_per_chunk],
+                                         values[i:i + rows_per_chunk])
+            )
+
+    @metrics.timed('db.most_recent')
+    def most_recent(self) -> dict:
+        """
+        Return the most recent reading.
+        """
+        return self.series()[-1:].to_frame()
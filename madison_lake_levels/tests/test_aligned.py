@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+from madison_lake_levels import aligned
+
+
+class Test_Aligned():
+    def setup_method(self):
+        index = pd.date_range('2018-12-30', '2020-03-02')
+        self.df = pd.DataFrame(
+            {'mendota': np.arange(index.size, dtype=float),
+             'monona': -np.arange(index.size, dtype=float)},
+            index=index
+        )
+
+    def test_day_of_year_drops_leap_day(self):
+        index = pd.to_datetime(['2019-03-01', '2020-02-28', '2020-02-29',
+                                '2020-03-01', '2020-12-31'])
+        assert aligned.day_of_year(index).tolist() == [59, 58, -1, 59, 364]
+
+    def test_dates(self):
+        a = aligned.YearAligned(self.df)
+        for year in [2019, 2020]:
+            dates = a.dates(year)
+            assert dates.size == aligned.DAYS_PER_YEAR
+            assert (aligned.day_of_year(dates) == np.arange(365)).all()
+
+    def test_layout(self):
+        a = aligned.YearAligned(self.df)
+        assert a.years.tolist() == [2018, 2019, 2020]
+        assert a.values.shape == (3, 365, 2)
+        assert a.last_day == 60
+        mendota = a.lake('mendota')
+        assert np.isnan(mendota[0, :363]).all()
+        for row, year in enumerate(a.years):
+            dates = a.dates(year)
+            expected = self.df['mendota'].reindex(dates).values
+            np.testing.assert_array_equal(mendota[row], expected)
+        # Every reading is kept except for Feb 29th.
+        assert (~np.isnan(mendota)).sum() == self.df.shape[0] - 1
+
+    def test_years(self):
+        a = aligned.YearAligned(self.df, years=2)
+        assert a.years.tolist() == [2019, 2020]
+        assert a.values.shape == (2, 365, 2)
+
+    def test_empty(self):
+        a = aligned.YearAligned(self.df.iloc[:0])
+        assert a.values.shape == (0, 365, 2)
+        assert a.last_day == -1
+
+    def test_year_span(self):
+        for years in [None, 1, 2]:
+            a = aligned.YearAligned(self.df, years=years)
+            span = aligned.year_span(self.df.index, years=years)
+            assert span[0].tolist() == a.years.tolist()
+            assert span[1] == a.last_day
+        # The latest date is Feb 29th, which has no slot of its own.
+        assert aligned.year_span(self.df.loc[:'2020-02-29'].index)[1] == 58
+        span = aligned.year_span(self.df.index[:0])
+        assert span[0].size == 0 and span[1] == -1
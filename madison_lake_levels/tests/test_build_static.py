@@ -0,0 +1,56 @@
+import importlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from madison_lake_levels import db
+
+_ROOT = Path(__file__).resolve().parents[2]
+
+
+class Test_BuildStatic():
+    def setup_method(self):
+        self.lldb = None
+
+    def teardown_method(self):
+        if self.lldb is not None:
+            self.lldb.close()
+
+    def _site(self, monkeypatch, tmp_path):
+        """
+        Import bin/build_static.py, with the app it renders pointed at a
+        SQLite database of two years of levels.
+        """
+        db_url = f'sqlite:///{tmp_path}/levels.db'
+        monkeypatch.setenv('DATABASE_URL', db_url)
+        monkeypatch.syspath_prepend(str(_ROOT))
+        monkeypatch.syspath_prepend(str(_ROOT / 'bin'))
+        try:
+            build_static = importlib.import_module('build_static')
+        except ImportError as e:
+            pytest.skip(f'Cannot import the app: {e}')
+
+        lakes = ['mendota', 'monona', 'waubesa', 'kegonsa']
+        index = pd.date_range('2017-01-01', '2018-12-31')
+        self.lldb = db.connect(db_url)
+        self.lldb.insert(pd.DataFrame(
+            850.0 + np.zeros((index.size, len(lakes))), index=index,
+            columns=lakes
+        ))
+        monkeypatch.setattr(build_static.site, 'lldb', self.lldb)
+        return build_static
+
+    def test_timeline_needs_no_app(self, monkeypatch, tmp_path):
+        build_static = self._site(monkeypatch, tmp_path)
+        out = tmp_path / 'build'
+        build_static.main(out, full=True)
+        page = (out / 'plot-timeline.html').read_text()
+        assert '/api/series' not in page
+        assert '/series/first_last_' in page
+        # No zoom callback, which would ask for data that is not there.
+        assert '_timelineTimer' not in page
+        with build_static.site.app.test_request_context():
+            page = build_static.site._plot_timeline_page()
+        assert '/api/series' in page and '_timelineTimer' in page
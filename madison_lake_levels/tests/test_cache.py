@@ -0,0 +1,28 @@
+from madison_lake_levels import cache
+
+
+class Test_Cache():
+    @staticmethod
+    def test_reuses_value_for_same_version():
+        c = cache.VersionedCache()
+        calls = []
+        assert c.get('a', 1, lambda: calls.append(1) or 'x') == 'x'
+        assert c.get('a', 1, lambda: calls.append(1) or 'y') == 'x'
+        assert len(calls) == 1
+
+    @staticmethod
+    def test_recomputes_on_new_version():
+        c = cache.VersionedCache()
+        c.get('a', 1, lambda: 'x')
+        assert c.get('a', 2, lambda: 'y') == 'y'
+        assert c.get('a', 2, lambda: 'z') == 'y'
+
+    @staticmethod
+    def test_evicts_least_recently_used():
+        c = cache.VersionedCache(maxsize=2)
+        c.get('a', 1, lambda: 'a')
+        c.get('b', 1, lambda: 'b')
+        c.get('a', 1, lambda: 'a2')
+        c.get('c', 1, lambda: 'c')
+        assert c.get('a', 1, lambda: 'a3') == 'a'
+        assert c.get('b', 1, lambda: 'b2') == 'b2'
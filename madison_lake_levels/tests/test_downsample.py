@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from madison_lake_levels import downsample
+
+
+class Test_Downsample():
+    def test_lttb_keeps_ends_and_peaks(self):
+        x = np.arange(1000)
+        y = np.sin(x / 50.0)
+        y[500] = 10.0
+        keep = downsample.lttb(x, y, 50)
+        assert keep.size == 50
+        assert keep[0] == 0 and keep[-1] == 999
+        assert (np.diff(keep) > 0).all()
+        assert 500 in keep
+
+    def test_lttb_short_input(self):
+        assert downsample.lttb(np.arange(10), np.zeros(10), 20).tolist() == (
+            list(range(10))
+        )
+
+    def test_downsample_frame(self):
+        index = pd.date_range('2010-01-01', periods=2000)
+        rng = np.random.RandomState(0)
+        df = pd.DataFrame({'a': rng.normal(size=2000).cumsum(),
+                           'b': rng.normal(size=2000).cumsum()}, index=index)
+        df.iloc[1000:1010, 0] = np.nan
+        out = downsample.downsample(df, 100)
+        assert 100 <= out.shape[0] <= 201
+        assert out.index.is_monotonic_increasing
+        assert out.index[0] == index[0] and out.index[-1] == index[-1]
+        # The gap still breaks the line.
+        assert index[1000] in out.index
+        assert np.isnan(out.loc[index[1000], 'a'])
+        for column in df.columns:
+            assert out[column].max() == df[column].max()
@@ -0,0 +1,190 @@
+import os
+import gc
+import shutil
+import tempfile
+import threading
+from datetime import datetime as dt
+from datetime import timezone
+
+import psycopg2
+import pytest
+
+from madison_lake_levels import db, jobs, scrape
+
+
+class Test_Jobs():
+    def setup_class(self):
+        self.test_db_name = 'madisonlakes_test'
+        self.db_config = {
+            'user': os.getenv('TEST_DB_USER', os.getenv('USER'))
+        }
+        for key, env_var in [('password', 'TEST_DB_PASS'),
+                             ('host', 'TEST_DB_HOST'),
+                             ('port', 'TEST_DB_PORT')]:
+            value = os.getenv(env_var)
+            if value is not None:
+                self.db_config[key] = value
+
+        self._templates_conn = psycopg2.connect(
+            database='template1', **self.db_config
+        )
+        self.db_config['database'] = self.test_db_name
+        self._templates_conn.autocommit = True
+        self._templates_curr = self._templates_conn.cursor()
+
+    def teardown_class(self):
+        self._templates_conn.close()
+
+    def setup_method(self):
+        self._drop_test_db()
+        self._templates_curr.execute(f"CREATE DATABASE {self.test_db_name};")
+        self.lldb = db.LakeLevelDB(pool_size=2, **self.db_config)
+        self.queue = jobs.job_queue(self.lldb)
+
+    def teardown_method(self):
+        self.lldb.close()
+        self._drop_test_db()
+
+    def _drop_test_db(self):
+        gc.collect()
+        try:
+            self._templates_curr.execute(f"DROP DATABASE {self.test_db_name};")
+        except psycopg2.ProgrammingError:
+            pass
+
+    def test_enqueue_and_claim(self):
+        job_id = self.queue.enqueue(dt(2020, 1, 1), dt(2020, 2, 1))
+        assert self.queue.status(job_id)['status'] == 'queued'
+        claimed = self.queue.claim()
+        assert claimed == (job_id, dt(2020, 1, 1, tzinfo=timezone.utc),
+                           dt(2020, 2, 1, tzinfo=timezone.utc))
+        assert self.queue.claim() is None
+        assert self.queue.status(job_id)['status'] == 'running'
+        self.queue.finish(job_id)
+        assert self.queue.status(job_id)['status'] == 'done'
+        assert self.queue.status(job_id + 1) is None
+
+    def test_covered_window_is_deduplicated(self):
+        job_id = self.queue.enqueue(dt(2020, 1, 1), dt(2020, 3, 1))
+        self.queue.claim()
+        assert self.queue.enqueue(dt(2020, 1, 5), dt(2020, 2, 1)) == job_id
+        # Not covered by the running job, so a new one is queued.
+        assert self.queue.enqueue(dt(2020, 2, 1), dt(2020, 4, 1)) != job_id
+
+    def test_adjacent_windows_are_coalesced(self):
+        first = self.queue.enqueue(dt(2020, 1, 1), dt(2020, 2, 1))
+        third = self.queue.enqueue(dt(2020, 3, 1), dt(2020, 4, 1))
+        assert third != first
+        # Touches both queued jobs, which become one.
+        assert self.queue.enqueue(dt(2020, 2, 1), dt(2020, 3, 1)) == first
+        status = self.queue.status(third)
+        assert status['merged_into'] == first
+        assert status['status'] == 'queued'
+        assert status['start'] == '2020-01-01T00:00:00+00:00'
+        assert status['end'] == '2020-04-01T00:00:00+00:00'
+        assert self.queue.claim()[0] == first
+        assert self.queue.claim() is None
+
+    def test_bad_window_raises(self):
+        with pytest.raises(ValueError):
+            self.queue.enqueue(dt(2020, 2, 1), dt(2020, 1, 1))
+
+    def test_stale_job_reclaimed(self):
+        queue = jobs.job_queue(self.lldb, stale_after=0)
+        job_id = queue.enqueue(dt(2020, 1, 1), dt(2020, 2, 1))
+        assert queue.claim()[0] == job_id
+        assert queue.claim()[0] == job_id
+
+    def test_run_worker(self, monkeypatch):
+        calls = []
+
+        def fake_backfill(start, end, lldb, verbose=False, **kwargs):
+            calls.append((start, end))
+            if start.year == 2021:
+                raise RuntimeError('USGS is down')
+
+        monkeypatch.setattr(scrape, 'backfill', fake_backfill)
+        ok = self.queue.enqueue(dt(2020, 1, 1), dt(2020, 2, 1))
+        failing = self.queue.enqueue(dt(2021, 1, 1), dt(2021, 2, 1))
+        jobs.run_worker(self.queue, self.lldb, once=True)
+        assert len(calls) == 2
+        assert self.queue.status(ok)['status'] == 'done'
+        status = self.queue.status(failing)
+        assert status['status'] == 'failed'
+        assert 'USGS is down' in status['error']
+
+    def test_worker_retries_claim(self, monkeypatch):
+        claim = self.queue.claim
+        failures = [self.queue.db_errors[0]('deadlock detected')]
+
+        def flaky_claim():
+            if failures:
+                raise failures.pop()
+            return claim()
+
+        monkeypatch.setattr(self.queue, 'claim', flaky_claim)
+        monkeypatch.setattr(scrape, 'backfill', lambda *args, **kwargs: None)
+        job_id = self.queue.enqueue(dt(2020, 1, 1), dt(2020, 2, 1))
+        jobs.run_worker(self.queue, self.lldb, poll_interval=0, once=True)
+        assert self.queue.status(job_id)['status'] == 'done'
+
+    def test_claim_and_coalescing_enqueue(self, monkeypatch):
+        job_id = self.queue.enqueue(dt(2020, 1, 1), dt(2020, 2, 1))
+        # Pause a worker once it has picked the job, then queue a window
+        # touching that job.
+        picked, resume = threading.Event(), threading.Event()
+        execute = self.queue._execute
+
+        def pausing_execute(cursor, cmd, params=()):
+            execute(cursor, cmd, params)
+            if "status = 'running' AND started" in cmd:
+                picked.set()
+                resume.wait(5)
+
+        monkeypatch.setattr(self.queue, '_execute', pausing_execute)
+        results = {}
+
+        def run(name, f):
+            try:
+                results[name] = f()
+            except Exception as e:
+                results[name] = e
+
+        worker = threading.Thread(target=run,
+                                  args=('claim', self.queue.claim))
+        worker.start()
+        assert picked.wait(5)
+        enqueuer = threading.Thread(target=run, args=(
+            'enqueue',
+            lambda: self.queue.enqueue(dt(2020, 2, 1), dt(2020, 3, 1))
+        ))
+        enqueuer.start()
+        enqueuer.join(0.5)
+        resume.set()
+        worker.join()
+        enqueuer.join()
+        assert results['claim'][0] == job_id
+        # The job was running by then, so a new one was queued.
+        assert results['enqueue'] not in [job_id, None]
+        assert not isinstance(results['enqueue'], Exception)
+
+class Test_SQLiteJobs(Test_Jobs):
+    """
+    The same tests against the queue kept in an embedded database.
+    """
+
+    def setup_class(self):
+        pass
+
+    def teardown_class(self):
+        pass
+
+    def setup_method(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.lldb = db.connect(f'sqlite:///{self.tmp_dir}/levels.db')
+        self.queue = jobs.job_queue(self.lldb)
+        assert isinstance(self.queue, jobs.SQLiteJobQueue)
+
+    def teardown_method(self):
+        self.lldb.close()
+        shutil.rmtree(self.tmp_dir)
@@ -0,0 +1,42 @@
+from madison_lake_levels import metrics
+
+
+class Test_Metrics():
+    @staticmethod
+    def setup_method():
+        metrics.reset()
+
+    def test_histogram_text(self):
+        metrics.observe('mll_span_seconds', 0.003, span='a')
+        metrics.observe('mll_span_seconds', 0.3, span='a')
+        metrics.observe('mll_span_seconds', 60.0, span='a')
+        lines = metrics.render_prometheus().splitlines()
+        assert lines[0].startswith('# HELP mll_span_seconds ')
+        assert lines[1] == '# TYPE mll_span_seconds histogram'
+        assert 'mll_span_seconds_bucket{span="a",le="0.005"} 1' in lines
+        assert 'mll_span_seconds_bucket{span="a",le="0.25"} 1' in lines
+        assert 'mll_span_seconds_bucket{span="a",le="0.5"} 2' in lines
+        assert 'mll_span_seconds_bucket{span="a",le="+Inf"} 3' in lines
+        assert 'mll_span_seconds_count{span="a"} 3' in lines
+        assert 'mll_span_seconds_sum{span="a"} 60.303' in lines
+
+    def test_label_escaping(self):
+        metrics.observe('mll_request_seconds', 1.0, endpoint='a"b\\c')
+        assert 'endpoint="a\\"b\\\\c"' in metrics.render_prometheus()
+
+    def test_spans_and_trace(self):
+        @metrics.timed('outer')
+        def outer():
+            with metrics.span('inner'):
+                pass
+
+        outer()
+        metrics.start_trace()
+        outer()
+        spans = metrics.end_trace()
+        assert [name for name, _ in spans] == ['inner', 'outer']
+        assert spans[1][1] >= spans[0][1]
+        assert metrics.end_trace() == []
+        text = metrics.render_prometheus()
+        assert 'mll_span_seconds_count{span="outer"} 2' in text
+        assert 'mll_span_seconds_count{span="inner"} 2' in text
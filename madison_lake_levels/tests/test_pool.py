@@ -0,0 +1,91 @@
+import os
+import threading
+
+import psycopg2
+import pytest
+
+from madison_lake_levels import pool
+
+
+class Test_Pool():
+    def setup_class(self):
+        self.db_config = {
+            'database': 'template1',
+            'user': os.getenv('TEST_DB_USER', os.getenv('USER')),
+        }
+        for key, env_var in [('password', 'TEST_DB_PASS'),
+                             ('host', 'TEST_DB_HOST'),
+                             ('port', 'TEST_DB_PORT')]:
+            value = os.getenv(env_var)
+            if value is not None:
+                self.db_config[key] = value
+
+    def test_reuses_connection(self):
+        p = pool.ConnectionPool(maxconn=2, **self.db_config)
+        with p.connection() as conn:
+            first = conn
+        with p.connection() as conn:
+            assert conn is first
+        assert p.stats()['size'] == 1
+        p.close()
+
+    def test_timeout_when_exhausted(self):
+        p = pool.ConnectionPool(maxconn=1, timeout=0.05, **self.db_config)
+        with p.connection():
+            with pytest.raises(pool.PoolTimeout):
+                with p.connection():
+                    pass
+        stats = p.stats()
+        assert stats['timeouts'] == 1
+        assert stats['in_use'] == 0
+        p.close()
+
+    def test_waits_for_release(self):
+        p = pool.ConnectionPool(maxconn=1, **self.db_config)
+        released = threading.Event()
+
+        def hold():
+            with p.connection():
+                released.wait()
+
+        t = threading.Thread(target=hold)
+        t.start()
+        threading.Timer(0.05, released.set).start()
+        with p.connection():
+            pass
+        t.join()
+        stats = p.stats()
+        assert stats['waits'] == 1
+        assert stats['wait_time_max'] > 0
+        assert stats['size'] == 1
+        p.close()
+
+    def test_reconnects_broken_connection(self):
+        p = pool.ConnectionPool(maxconn=1, health_check_interval=0,
+                                **self.db_config)
+        with p.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT pg_backend_pid()')
+                pid = cursor.fetchone()[0]
+            conn.rollback()
+        admin = psycopg2.connect(**self.db_config)
+        with admin.cursor() as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)', (pid,))
+        admin.close()
+        with p.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                assert cursor.fetchone()[0] == 1
+        assert p.stats()['reconnects'] == 1
+        p.close()
+
+    def test_discards_connection_after_error(self):
+        p = pool.ConnectionPool(maxconn=1, **self.db_config)
+        with pytest.raises(psycopg2.InterfaceError):
+            with p.connection() as conn:
+                conn.close()
+                conn.cursor()
+        assert p.stats()['size'] == 0
+        with p.connection() as conn:
+            assert not conn.closed
+        p.close()
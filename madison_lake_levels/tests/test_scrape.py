@@ -1,5 +1,11 @@
 from datetime import datetime as dt
 from datetime import timedelta
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+import requests
 
 from madison_lake_levels import scrape
 
@@ -22,3 +28,367 @@ class Test_Scrape():
     #     # -999999
     #     df = scrape.scrape(dt(2019, 2, 26), dt(2019, 2, 27))
     #     assert df['mendota'].isnull().all()
+
+
+class Test_Parse():
+    json_payload = json.dumps({'value': {'timeSeries': [
+        {
+            'sourceInfo': {'siteName': 'LAKE MENDOTA AT MADISON, WI',
+                           'siteCode': [{'value': '05428000'}]},
+            'variable': {'noDataValue': -999999.0},
+            'values': [{'value': [
+                {'value': '9.51', 'dateTime': '2019-03-10T01:45:00.000-06:00'},
+                {'value': '-999999', 'dateTime': '2019-03-10T03:00:00.000-05:00'},
+                {'value': '9.53', 'dateTime': '2019-03-10T03:15:00.000-05:00'},
+            ]}],
+        },
+        {
+            'sourceInfo': {'siteName': 'LAKE MONONA AT MADISON, WI',
+                           'siteCode': [{'value': '05429000'}]},
+            'variable': {'noDataValue': -999999.0},
+            'values': [{'value': [
+                {'value': '4.90', 'dateTime': '2019-03-10T03:00:00.000-05:00'},
+            ]}],
+        },
+    ]}})
+
+    rdb_payload = '\n'.join([
+        '# comment',
+        'agency_cd\tsite_no\tdatetime\ttz_cd\t1_00065\t1_00065_cd',
+        '5s\t15s\t20d\t6s\t14n\t10s',
+        'USGS\t05428000\t2019-03-10 01:45\tCST\t9.51\tP',
+        'USGS\t05428000\t2019-03-10 03:00\tCDT\t\tEqp',
+        'USGS\t05428000\t2019-03-10 03:15\tCDT\t9.53\tP',
+        '# comment',
+        'agency_cd\tsite_no\tdatetime\ttz_cd\t2_00065\t2_00065_cd',
+        '5s\t15s\t20d\t6s\t14n\t10s',
+        'USGS\t05429000\t2019-03-10 03:00\tCDT\t4.90\tP',
+        '',
+    ])
+
+    expected = pd.DataFrame(
+        {
+            'mendota': [9.51, np.nan, 9.53],
+            'monona': [np.nan, 4.90, np.nan],
+            'waubesa': np.nan,
+            'kegonsa': np.nan,
+        },
+        index=pd.to_datetime(['2019-03-10 07:45', '2019-03-10 08:00',
+                              '2019-03-10 08:15'], utc=True),
+    )
+
+    def test_json(self):
+        df = scrape.parse_iv_json(self.json_payload)
+        pd.testing.assert_frame_equal(df, self.expected, check_freq=False)
+
+    def test_rdb(self):
+        df = scrape.parse_iv_rdb(self.rdb_payload)
+        pd.testing.assert_frame_equal(df, self.expected, check_freq=False)
+
+    def test_named_by_sites(self):
+        sites = {'yahara': '05429000', 'mendota': '05428000'}
+        for parse, text in [(scrape.parse_iv_json, self.json_payload),
+                            (scrape.parse_iv_rdb, self.rdb_payload)]:
+            df = parse(text, sites)
+            assert df.columns.tolist() == ['yahara', 'mendota']
+            assert df['yahara'].dropna().tolist() == [4.90]
+
+    @staticmethod
+    def test_timestamps_match_pandas():
+        times = np.array(['2019-04-01T00:15:00.000-05:00',
+                          '2020-02-29T23:59:59.999-06:00',
+                          '2019-01-01T23:59:59.500+01:30'])
+        assert (scrape._parse_usgs_timestamps(times)
+                == pd.to_datetime(times, utc=True)).all()
+
+
+class Test_Request():
+    class FakeSession():
+        def __init__(self, outcomes):
+            self.outcomes = list(outcomes)
+            self.calls = 0
+
+        def post(self, url, timeout):
+            self.calls += 1
+            outcome = self.outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            r = requests.Response()
+            r.status_code = outcome
+            r.url = url
+            return r
+
+    @staticmethod
+    def setup_method():
+        scrape.reset_http_stats()
+
+    def test_retries_then_succeeds(self, monkeypatch):
+        session = self.FakeSession([503, requests.ConnectionError(), 200])
+        monkeypatch.setattr(scrape, '_get_session', lambda: session)
+        monkeypatch.setattr(scrape.time, 'sleep', lambda seconds: None)
+        r = scrape._request('iv', 'http://usgs.invalid/iv')
+        assert r.status_code == 200
+        stats = scrape.http_stats()['iv']
+        assert stats['requests'] == 3
+        assert stats['retries'] == 2
+        assert stats['failures'] == 0
+
+    def test_gives_up(self, monkeypatch):
+        session = self.FakeSession([500] * 10)
+        monkeypatch.setattr(scrape, '_get_session', lambda: session)
+        monkeypatch.setattr(scrape.time, 'sleep', lambda seconds: None)
+        with pytest.raises(requests.HTTPError):
+            scrape._request('iv', 'http://usgs.invalid/iv')
+        assert session.calls == scrape.http_max_retries + 1
+        assert scrape.http_stats()['iv']['failures'] == 1
+
+    def test_client_error_not_retried(self, monkeypatch):
+        session = self.FakeSession([400, 200])
+        monkeypatch.setattr(scrape, '_get_session', lambda: session)
+        with pytest.raises(requests.HTTPError):
+            scrape._request('site', 'http://usgs.invalid/site')
+        assert session.calls == 1
+
+
+class Test_Datum():
+    site_rdb = (
+        '# comment\n'
+        'agency_cd\tsite_no\tstation_nm\talt_va\n'
+        '5s\t15s\t50s\t8s\n'
+        'USGS\t05428000\tLAKE MENDOTA AT MADISON, WI\t840.00\n'
+        'USGS\t05429000\tLAKE MONONA AT MADISON, WI\t845.00\n'
+    )
+
+    def setup_method(self):
+        self.calls = 0
+        scrape._datum_memory.clear()
+
+    def fake_request(self, endpoint, url):
+        self.calls += 1
+        r = requests.Response()
+        r.status_code = 200
+        r._content = self.site_rdb.encode()
+        return r
+
+    def test_shared_on_disk(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(scrape, 'datum_cache_dir', tmp_path)
+        monkeypatch.setattr(scrape, '_request', self.fake_request)
+        datum = scrape.get_datum_elevation('05428000,05429000')
+        assert datum.loc['mendota', 'alt_va'] == 840.0
+        assert datum.loc['monona', 'alt_va'] == 845.0
+        assert scrape.get_datum_elevation('05428000,05429000') is datum
+        # A new process only has the file to go on.
+        scrape._datum_memory.clear()
+        again = scrape.get_datum_elevation('05428000,05429000')
+        pd.testing.assert_frame_equal(datum, again)
+        assert self.calls == 1
+        assert [p.suffix for p in tmp_path.iterdir()] == ['.rdb']
+
+    def test_refreshes_after_ttl(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(scrape, 'datum_cache_dir', tmp_path)
+        monkeypatch.setattr(scrape, '_request', self.fake_request)
+        monkeypatch.setattr(scrape, 'datum_cache_ttl', 0)
+        scrape.get_datum_elevation('05428000')
+        scrape.get_datum_elevation('05428000')
+        assert self.calls == 2
+
+    def test_stale_when_unreachable(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(scrape, 'datum_cache_dir', tmp_path)
+        monkeypatch.setattr(scrape, '_request', self.fake_request)
+        scrape.get_datum_elevation('05428000')
+
+        def unreachable(endpoint, url):
+            raise requests.ConnectionError()
+
+        monkeypatch.setattr(scrape, '_request', unreachable)
+        monkeypatch.setattr(scrape, 'datum_cache_ttl', 0)
+        with pytest.warns(UserWarning):
+            datum = scrape.get_datum_elevation('05428000')
+        assert datum.loc['mendota', 'alt_va'] == 840.0
+        with pytest.raises(requests.ConnectionError):
+            scrape.get_datum_elevation('05429000')
+
+    def test_outage_not_retried_every_call(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(scrape, 'datum_cache_dir', tmp_path)
+        monkeypatch.setattr(scrape, '_request', self.fake_request)
+        scrape.get_datum_elevation('05428000')
+        attempts = []
+
+        def unreachable(endpoint, url):
+            attempts.append(url)
+            raise requests.ConnectionError()
+
+        monkeypatch.setattr(scrape, '_request', unreachable)
+        monkeypatch.setattr(scrape, 'datum_cache_ttl', 0)
+        scrape._datum_memory.clear()
+        with pytest.warns(UserWarning):
+            scrape.get_datum_elevation('05428000')
+        datum = scrape.get_datum_elevation('05428000')
+        assert datum.loc['mendota', 'alt_va'] == 840.0
+        assert len(attempts) == 1
+
+
+class Test_ScrapeSites():
+    def setup_method(self):
+        self.urls = []
+        scrape._datum_memory.clear()
+
+    def fake_request(self, endpoint, url):
+        self.urls.append(url)
+        sites = url.split('&sites=')[1].split('&')[0].split(',')
+        r = requests.Response()
+        r.status_code = 200
+        if endpoint == 'site':
+            r._content = ''.join(
+                ['agency_cd\tsite_no\tstation_nm\talt_va\n',
+                 '5s\t15s\t50s\t8s\n']
+                + [f'USGS\t{site}\tLAKE {site} AT MADISON, WI\t{i}00.0\n'
+                   for i, site in enumerate(sites)]
+            ).encode()
+        else:
+            r._content = json.dumps({'value': {'timeSeries': [
+                {'sourceInfo': {'siteCode': [{'value': site}]},
+                 'variable': {'noDataValue': -999999.0},
+                 'values': [{'value': [{
+                     'value': '1.5',
+                     'dateTime': '2019-03-10T01:45:00.000-06:00'
+                 }]}]}
+                for site in sites
+            ]}}).encode()
+        return r
+
+    def test_batches(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(scrape, 'datum_cache_dir', tmp_path)
+        monkeypatch.setattr(scrape, '_request', self.fake_request)
+        monkeypatch.setattr(scrape, 'sites_per_request', 2)
+        sites = {'a': '01', 'b': '02', 'c': '03'}
+        df = scrape.scrape(dt(2019, 3, 10), dt(2019, 3, 11), sites=sites)
+        assert df.columns.tolist() == ['a', 'b', 'c']
+        assert df.iloc[0].tolist() == [1.5, 101.5, 1.5]
+        iv_urls = [url for url in self.urls if 'format=json' in url]
+        assert len(iv_urls) == 2
+        assert '&sites=01,02&' in iv_urls[0]
+
+
+class Test_Backfill():
+    class FakeDB():
+        def __init__(self):
+            self.inserted = []
+
+        def sites(self):
+            return {'mendota': '05428000', 'monona': '05429000'}
+
+        def insert_readings(self, df):
+            self.inserted.append(df)
+
+    @staticmethod
+    def fake_scrape(start, end, sites=None):
+        index = pd.date_range(start, end, freq='6H', tz='UTC')
+        return pd.DataFrame(
+            {lake: np.arange(index.size, dtype=float)
+             for lake in sites},
+            index=index
+        )
+
+    def test_concurrent(self, monkeypatch):
+        monkeypatch.setattr(scrape, 'scrape', self.fake_scrape)
+        lldb = self.FakeDB()
+        scrape.backfill(dt(2010, 1, 1), dt(2011, 1, 1), lldb,
+                        workers=4, rate=1000, batch_days=100)
+        assert len(lldb.inserted) > 1
+        # Every registered site is scraped.
+        assert lldb.inserted[0].columns.tolist() == ['mendota', 'monona']
+        readings = pd.concat(lldb.inserted).index
+        assert set(readings) == set(
+            pd.date_range('2010-01-01', '2011-01-01', freq='6H', tz='UTC')
+        )
+
+    def test_single_day(self, monkeypatch):
+        calls = []
+
+        def recording_scrape(start, end, sites=None):
+            calls.append((start, end))
+            return self.fake_scrape(start, end, sites)
+
+        monkeypatch.setattr(scrape, 'scrape', recording_scrape)
+        scrape.backfill(dt(2010, 1, 5), dt(2010, 1, 5), self.FakeDB(),
+                        rate=1000)
+        assert calls == [(dt(2010, 1, 5), dt(2010, 1, 5))]
+
+    def test_resumes_from_checkpoint(self, monkeypatch, tmp_path):
+        checkpoint = tmp_path / 'backfill.json'
+        calls = []
+
+        def failing_scrape(start, end, sites=None):
+            calls.append(start)
+            if start >= dt(2010, 6, 1):
+                raise RuntimeError('USGS is down')
+            return self.fake_scrape(start, end, sites)
+
+        monkeypatch.setattr(scrape, 'scrape', failing_scrape)
+        with pytest.raises(RuntimeError):
+            scrape.backfill(dt(2010, 1, 1), dt(2011, 1, 1), self.FakeDB(),
+                            rate=1000, checkpoint=checkpoint, batch_days=1)
+        resumed_at = json.loads(checkpoint.read_text())['done_through']
+        assert dt(2010, 1, 1) < dt.fromisoformat(resumed_at) <= dt(2010, 6, 30)
+
+        monkeypatch.setattr(scrape, 'scrape', self.fake_scrape)
+        lldb = self.FakeDB()
+        scrape.backfill(dt(2010, 1, 1), dt(2011, 1, 1), lldb,
+                        rate=1000, checkpoint=checkpoint)
+        assert pd.concat(lldb.inserted).index.min() == pd.Timestamp(
+            resumed_at, tz='UTC'
+        )
+        assert json.loads(checkpoint.read_text())['done_through'] == (
+            dt(2011, 1, 1).isoformat()
+        )
+
+    def test_gap_windows(self):
+        index = pd.to_datetime(['2010-01-01', '2010-01-05', '2010-01-30',
+                                '2010-01-31', '2010-03-02'])
+        gaps = pd.DataFrame({'kind': 'partial',
+                             'mendota': [True, False, False, False, True],
+                             'monona': [False, True, False, True, False]},
+                            index=index)
+        sites = self.FakeDB().sites()
+        windows = scrape.gap_windows(gaps, sites)
+        assert [(start, end) for start, end, _ in windows] == [
+            (dt(2010, 1, 1), dt(2010, 1, 30)),
+            (dt(2010, 1, 31), dt(2010, 1, 31)),
+            (dt(2010, 3, 2), dt(2010, 3, 2)),
+        ]
+        assert [list(sites) for _, _, sites in windows] == [
+            ['mendota', 'monona'], ['monona'], ['mendota']
+        ]
+        assert scrape.gap_windows(gaps.iloc[:0], sites) == []
+
+    def test_backfill_gaps(self, monkeypatch):
+        lldb = self.FakeDB()
+        gaps = pd.DataFrame({'kind': ['partial'], 'mendota': [False],
+                             'monona': [True]},
+                            index=pd.to_datetime(['2010-01-01']))
+        lldb.gaps = lambda start, end, sites: gaps
+        monkeypatch.setattr(scrape, 'scrape', self.fake_scrape)
+        windows = scrape.backfill_gaps(lldb, rate=1000)
+        assert windows == [
+            (dt(2010, 1, 1), dt(2010, 1, 1), {'monona': '05429000'})
+        ]
+        assert lldb.inserted[0].columns.tolist() == ['monona']
+        lldb.inserted = []
+        lldb.gaps = lambda start, end, sites: gaps.iloc[:0]
+        assert scrape.backfill_gaps(lldb) == []
+        assert lldb.inserted == []
+
+    def test_backfill_gaps_writes_in_batches(self, monkeypatch):
+        lldb = self.FakeDB()
+        index = pd.date_range('2010-01-01', periods=20, freq='2D')
+        gaps = pd.DataFrame({'kind': 'missing', 'mendota': True,
+                             'monona': True}, index=index)
+        lldb.gaps = lambda start, end, sites: gaps
+        monkeypatch.setattr(scrape, 'scrape', self.fake_scrape)
+        windows = scrape.backfill_gaps(lldb, max_days=1, rate=1000,
+                                       batch_days=5)
+        assert len(windows) == 20
+        assert len(lldb.inserted) > 1
+        written = pd.concat(lldb.inserted).index.normalize().tz_localize(None)
+        assert set(written) == set(index)
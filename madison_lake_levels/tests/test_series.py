@@ -0,0 +1,117 @@
+import base64
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from madison_lake_levels import series
+from madison_lake_levels.series import LakeSeries
+
+
+class Test_LakeSeries():
+    def setup_method(self):
+        index = pd.to_datetime(['2018-09-30', '2018-10-01', '2018-10-03',
+                                '2018-10-04'])
+        self.df = pd.DataFrame(
+            {'mendota': [849.12, np.nan, 849.35, np.nan],
+             'monona': [845.0, 845.01, np.nan, np.nan]},
+            index=index
+        )
+        self.series = LakeSeries.from_frame(self.df)
+
+    def test_layout(self):
+        s = self.series
+        assert len(s) == 4
+        assert s.days.dtype == np.int32 and s.values.dtype == np.float32
+        assert s.values.shape == (2, 4)
+        assert s.values.flags.c_contiguous
+        assert s.days[0] == (pd.Timestamp('2018-09-30')
+                             - pd.Timestamp('1970-01-01')).days
+        assert s.nbytes == 4 * 4 + 2 * 4 * 4
+        with pytest.raises(ValueError):
+            s.values[0, 0] = 0.0
+
+    def test_to_frame_round_trips(self):
+        out = self.series.to_frame()
+        assert out.equals(self.df)
+        assert out.index.name == 'datetime'
+        assert LakeSeries.empty(['mendota']).to_frame().shape == (0, 1)
+
+    def test_as_float64_shortest(self):
+        values = np.array([850.26, 849.12345, 0.5, 1e-5, 3e8, np.nan],
+                          dtype=np.float32)
+        np.testing.assert_array_equal(
+            series.as_float64(values), values.astype(str).astype(float)
+        )
+
+    def test_row_and_at(self):
+        s = self.series
+        assert s.row('2018-10-03') == 2
+        assert s.row('2018-10-03 12:00') == 2
+        assert s.row('2018-10-02') == -1
+        assert s.row('2018-01-01') == -1
+        assert s.row('2019-01-01') == -1
+        assert s.at('2018-09-30') == {'mendota': 849.12, 'monona': 845.0}
+        assert s.at('2018-10-03') == {'mendota': 849.35, 'monona': None}
+        assert s.at('2018-10-02') == {'mendota': None, 'monona': None}
+
+    def test_between_is_a_view(self):
+        s = self.series
+        window = s.between('2018-10-01', '2018-10-03')
+        assert window.dates().tolist() == list(
+            pd.to_datetime(['2018-10-01', '2018-10-03'])
+        )
+        assert np.shares_memory(window.values, s.values)
+        assert len(s.between(start='2018-10-04')) == 1
+        assert len(s.between(end='2018-01-01')) == 0
+        assert s[-1:].dates()[0] == pd.Timestamp('2018-10-04')
+
+    def test_select_and_latest(self):
+        s = self.series
+        assert s.select(['mendota', 'monona']) is s
+        assert s.select(['monona']).lakes == ['monona']
+        np.testing.assert_array_equal(s.lake('monona'), s.values[1])
+        latest = s.latest().to_frame()
+        assert latest.index.tolist() == list(
+            pd.to_datetime(['2018-10-01', '2018-10-03'])
+        )
+        assert latest.loc['2018-10-01', 'monona'] == 845.01
+        assert np.isnan(latest.loc['2018-10-01', 'mendota'])
+        assert len(s.between(end='2017-01-01').latest()) == 0
+
+    def test_merge(self):
+        s = self.series
+        update = LakeSeries.from_frame(pd.DataFrame(
+            {'mendota': [1.0, 2.0], 'monona': [3.0, 4.0]},
+            index=pd.to_datetime(['2018-10-01', '2018-10-02'])
+        ))
+        merged = s.merge(update).to_frame()
+        assert merged.index.is_monotonic_increasing
+        assert merged.shape == (5, 2)
+        assert merged.loc['2018-10-02', 'monona'] == 4.0
+        assert merged.loc['2018-10-01', 'mendota'] == 1.0
+        assert merged.loc['2018-09-30', 'mendota'] == 849.12
+        appended = LakeSeries.empty(s.lakes).merge(s)
+        assert appended.to_frame().equals(self.df)
+        with pytest.raises(ValueError):
+            s.merge(s.select(['monona']))
+
+    def test_epoch_ms(self):
+        assert self.series.epoch_ms().tolist() == (
+            self.df.index.asi8 // 10**6
+        ).tolist()
+
+    def test_to_payload(self):
+        s = self.series[:2]
+        payload = s.to_payload()
+        assert payload == {'day': s.days.tolist(), 'mendota': [849.12, None],
+                           'monona': [845.0, 845.01]}
+        encoded = s.to_payload('base64')
+        assert encoded['day']['dtype'] == 'int32'
+        assert encoded['mendota']['shape'] == [2]
+        mendota = np.frombuffer(
+            base64.b64decode(encoded['mendota']['__ndarray__']), '<f4'
+        )
+        np.testing.assert_array_equal(mendota, s.lake('mendota'))
+        with pytest.raises(ValueError):
+            s.to_payload('xml')